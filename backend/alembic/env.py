@@ -0,0 +1,81 @@
+"""
+Alembic migration environment.
+Runs migrations through the application's async engine, so the database URL,
+pool settings and SQLite pragmas all come from app.core.
+"""
+
+import asyncio
+from logging.config import fileConfig
+
+from sqlalchemy.engine import Connection
+
+from alembic import context
+
+from app.core.config import settings
+from app.core.database import Base, engine
+
+# Import all models to ensure they are registered with Base
+from app.models.user import User  # noqa: F401
+from app.models.project import Project  # noqa: F401
+from app.models.document import Document  # noqa: F401
+from app.models.chat import ChatMessage  # noqa: F401
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    """Skip Postgres-only indexes (e.g. GIN) when comparing against other backends"""
+    if type_ == "index" and context.get_context().dialect.name != "postgresql":
+        if object.dialect_options["postgresql"]["using"]:
+            return False
+    return True
+
+
+def run_migrations_offline() -> None:
+    """Run migrations in 'offline' mode, emitting SQL to the script output"""
+    context.configure(
+        url=settings.DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=True,
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def do_run_migrations(connection: Connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_object=include_object,
+        render_as_batch=True,  # SQLite needs batch mode for ALTER TABLE
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_async_migrations() -> None:
+    """Run migrations on a connection from the application engine"""
+    async with engine.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+
+    await engine.dispose()
+
+
+def run_migrations_online() -> None:
+    """Run migrations in 'online' mode."""
+    asyncio.run(run_async_migrations())
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,32 @@
+"""denormalized project_count on users
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-15 14:10:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('project_count', sa.Integer(), server_default=sa.text('0'), nullable=False))
+
+    op.execute(
+        "UPDATE users SET project_count = "
+        "(SELECT COUNT(*) FROM projects WHERE projects.owner_id = users.id)"
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('project_count')
@@ -0,0 +1,93 @@
+"""materialized document counters on projects, kept in sync by triggers
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-15 15:05:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Trigger DDL as of this revision, kept inline so later model changes do not alter it
+_INSERT_COUNTS = """
+    UPDATE projects SET
+        document_count = document_count + 1,
+        analyzed_document_count = analyzed_document_count + (CASE WHEN NEW.is_analyzed THEN 1 ELSE 0 END),
+        progress = CASE WHEN document_count + 1 > 0
+            THEN (analyzed_document_count + (CASE WHEN NEW.is_analyzed THEN 1 ELSE 0 END)) * 100.0 / (document_count + 1)
+            ELSE 0.0 END
+    WHERE id = NEW.project_id"""
+
+_DELETE_COUNTS = """
+    UPDATE projects SET
+        document_count = document_count - 1,
+        analyzed_document_count = analyzed_document_count - (CASE WHEN OLD.is_analyzed THEN 1 ELSE 0 END),
+        progress = CASE WHEN document_count - 1 > 0
+            THEN (analyzed_document_count - (CASE WHEN OLD.is_analyzed THEN 1 ELSE 0 END)) * 100.0 / (document_count - 1)
+            ELSE 0.0 END
+    WHERE id = OLD.project_id"""
+
+PROJECT_COUNT_TRIGGERS = {
+    'sqlite': [
+        f"CREATE TRIGGER trg_documents_insert_project_counts AFTER INSERT ON documents "
+        f"BEGIN {_INSERT_COUNTS}; END",
+        f"CREATE TRIGGER trg_documents_delete_project_counts AFTER DELETE ON documents "
+        f"BEGIN {_DELETE_COUNTS}; END",
+        f"CREATE TRIGGER trg_documents_update_project_counts AFTER UPDATE OF is_analyzed, project_id ON documents "
+        f"BEGIN {_DELETE_COUNTS}; {_INSERT_COUNTS}; END",
+    ],
+    'postgresql': [
+        f"CREATE OR REPLACE FUNCTION documents_project_counts() RETURNS trigger AS $$ "
+        f"BEGIN "
+        f"IF TG_OP IN ('UPDATE', 'DELETE') THEN {_DELETE_COUNTS}; END IF; "
+        f"IF TG_OP IN ('INSERT', 'UPDATE') THEN {_INSERT_COUNTS}; END IF; "
+        f"RETURN NULL; "
+        f"END; $$ LANGUAGE plpgsql",
+        "CREATE TRIGGER trg_documents_project_counts "
+        "AFTER INSERT OR DELETE OR UPDATE OF is_analyzed, project_id ON documents "
+        "FOR EACH ROW EXECUTE FUNCTION documents_project_counts()",
+    ],
+}
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('projects', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('document_count', sa.Integer(), server_default=sa.text('0'), nullable=False))
+        batch_op.add_column(sa.Column('analyzed_document_count', sa.Integer(), server_default=sa.text('0'), nullable=False))
+
+    op.execute(
+        "UPDATE projects SET "
+        "document_count = (SELECT COUNT(*) FROM documents WHERE documents.project_id = projects.id), "
+        "analyzed_document_count = (SELECT COUNT(*) FROM documents "
+        "WHERE documents.project_id = projects.id AND documents.is_analyzed)"
+    )
+    op.execute(
+        "UPDATE projects SET progress = CASE WHEN document_count > 0 "
+        "THEN analyzed_document_count * 100.0 / document_count ELSE 0.0 END"
+    )
+
+    for statement in PROJECT_COUNT_TRIGGERS.get(op.get_bind().dialect.name, []):
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS trg_documents_insert_project_counts")
+        op.execute("DROP TRIGGER IF EXISTS trg_documents_delete_project_counts")
+        op.execute("DROP TRIGGER IF EXISTS trg_documents_update_project_counts")
+    elif dialect == 'postgresql':
+        op.execute("DROP TRIGGER IF EXISTS trg_documents_project_counts ON documents")
+        op.execute("DROP FUNCTION IF EXISTS documents_project_counts()")
+
+    with op.batch_alter_table('projects', schema=None) as batch_op:
+        batch_op.drop_column('analyzed_document_count')
+        batch_op.drop_column('document_count')
@@ -0,0 +1,29 @@
+"""add id to the chat timeline index
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-15 18:10:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('chat_messages', schema=None) as batch_op:
+        batch_op.drop_index('ix_chat_messages_project_id_created_at')
+        batch_op.create_index('ix_chat_messages_project_id_created_at_id', ['project_id', sa.text('created_at DESC'), sa.text('id DESC')], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('chat_messages', schema=None) as batch_op:
+        batch_op.drop_index('ix_chat_messages_project_id_created_at_id')
+        batch_op.create_index('ix_chat_messages_project_id_created_at', ['project_id', sa.text('created_at DESC')], unique=False)
@@ -0,0 +1,29 @@
+"""index the project listing by updated_at
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-15 18:25:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('projects', schema=None) as batch_op:
+        batch_op.drop_index('ix_projects_owner_id_last_activity')
+        batch_op.create_index('ix_projects_owner_id_updated_at', ['owner_id', sa.text('updated_at DESC')], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('projects', schema=None) as batch_op:
+        batch_op.drop_index('ix_projects_owner_id_updated_at')
+        batch_op.create_index('ix_projects_owner_id_last_activity', ['owner_id', sa.text('last_activity DESC')], unique=False)
@@ -1,45 +1,95 @@
-from pydantic_settings import BaseSettings
-from typing import List
+from pydantic import SecretStr
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from functools import lru_cache
+from typing import FrozenSet, List
 from pathlib import Path
 
 
 class Settings(BaseSettings):
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        case_sensitive=True,
+        extra="allow",
+    )
+    
     # Application
     APP_NAME: str = "TutUni AI Backend"
     VERSION: str = "0.1.0"
     ENVIRONMENT: str = "development"
     
     # Security
-    SECRET_KEY: str = "your-super-secret-key-change-in-production"
+    SECRET_KEY: SecretStr = SecretStr("your-super-secret-key-change-in-production")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 30  # 30 days
+    # argon2id cost parameters; lower them only for dev/CI to speed up hashing
+    ARGON2_TIME_COST: int = 2
+    ARGON2_MEMORY_COST: int = 65536  # KiB
+    ARGON2_PARALLELISM: int = 2
     
     # CORS
-    ALLOWED_ORIGINS: List[str] = ["http://localhost:3000", "https://tutuni-ai.vercel.app"]
-    ALLOWED_HOSTS: List[str] = ["localhost", "127.0.0.1", "tutuni-ai-backend.render.com"]
+    ALLOWED_ORIGINS: FrozenSet[str] = frozenset({"http://localhost:3000", "https://tutuni-ai.vercel.app"})
+    ALLOWED_HOSTS: FrozenSet[str] = frozenset({"localhost", "127.0.0.1", "tutuni-ai-backend.render.com"})
     
     # Database - Default to SQLite for development
     DATABASE_URL: str = "sqlite+aiosqlite:///./data/tutuni_ai.db"
     DATABASE_ECHO: bool = False
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30  # seconds
+    DB_POOL_RECYCLE: int = 1800  # seconds
+    DB_TCP_KEEPALIVES_IDLE: int = 60  # seconds
+    DB_TCP_KEEPALIVES_INTERVAL: int = 10  # seconds
+    DB_TCP_KEEPALIVES_COUNT: int = 5
+    DB_QUERY_CACHE_SIZE: int = 1200  # compiled statement cache entries
+    DB_PGBOUNCER: bool = False  # set when DATABASE_URL points at PgBouncer in transaction mode
     
     # Redis
     REDIS_URL: str = "redis://localhost:6379"
     
     # Vector Database
     VECTOR_DB_PATH: str = "./data/vector_db"
+    EMBED_BATCH_SIZE: int = 64  # chunks per embedding model forward pass
+    VECTOR_UPSERT_BATCH: int = 256  # chunks embedded and written to the collection at a time
+    COLLECTION_STATS_TTL: int = 30  # seconds a project's chunk count is reused
+    VECTOR_HEALTH_TTL: int = 30  # seconds a vector database heartbeat result is reused
+    
+    # Semantic answer cache
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_THRESHOLD: float = 0.92  # cosine similarity for a hit
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 256  # per project
+    SEMANTIC_CACHE_TTL: int = 3600  # seconds
+    
+    # Project ownership cache
+    OWNERSHIP_CACHE_TTL: int = 30  # seconds
+    OWNERSHIP_CACHE_MAX_ENTRIES: int = 10000
+    
+    # Authenticated user cache
+    USER_CACHE_TTL: int = 30  # seconds, keep well below ACCESS_TOKEN_EXPIRE_MINUTES
+    USER_CACHE_MAX_ENTRIES: int = 10000
     
     # AI Services
     AI_PROVIDER: str = "ollama"  # Options: "anthropic", "groq", "ollama", "local"
-    ANTHROPIC_API_KEY: str = ""
-    GROQ_API_KEY: str = ""
+    ANTHROPIC_API_KEY: SecretStr = SecretStr("")
+    GROQ_API_KEY: SecretStr = SecretStr("")
     OLLAMA_HOST: str = "http://100.65.152.95:11434"
     OLLAMA_MODEL: str = "deepseek-r1:latest"  # Specific model to use
     OLLAMA_EMBEDDING_MODEL: str = "deepseek-r1:latest"  # Embedding model
+    AI_MAX_CONCURRENT_GENERATIONS: int = 4  # in-flight requests to a remote provider, the rest queue
+    # Dynamic int8 quantization of the local embedding model on CPU; vectors differ
+    # slightly from fp32 ones, so re-index documents after switching
+    EMBEDDING_INT8: bool = False
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 10000  # per-process text -> embedding LRU
+    TORCH_NUM_THREADS: int = 0  # intra-op threads for the embedding model, 0 = torch default; match the CPU quota
     
     # File Storage
     UPLOAD_DIR: Path = Path("./uploads")
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
     ALLOWED_FILE_TYPES: List[str] = [".pdf", ".docx", ".txt"]
+    DOC_WORKERS: int = 4  # documents processed concurrently by the background processor
+    DOC_POLL_INTERVAL: float = 5.0  # seconds between polls for uploads from other processes while work is found
+    DOC_POLL_MAX_INTERVAL: float = 60.0  # upper bound for the poll interval, which doubles after each empty poll
+    DOC_PROCESSING_TIMEOUT: int = 30 * 60  # seconds before a PROCESSING claim counts as abandoned and is released
+    PDF_WORKERS: int = 0  # PDF parsing processes, 0 = one per CPU core
     
     # Rate Limiting
     RATE_LIMIT_REQUESTS: int = 100
@@ -49,21 +99,21 @@ class Settings(BaseSettings):
     SMTP_HOST: str = ""
     SMTP_PORT: int = 587
     SMTP_USER: str = ""
-    SMTP_PASSWORD: str = ""
+    SMTP_PASSWORD: SecretStr = SecretStr("")
     EMAILS_FROM_EMAIL: str = ""
     EMAILS_FROM_NAME: str = "TutUni AI"
-    
-    class Config:
-        env_file = ".env"
-        case_sensitive = True
-        extra = "allow"
-        
-    def __post_init__(self):
-        # Create upload directory if it doesn't exist
-        self.UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-        
-        # Create data directory if it doesn't exist
-        Path("./data").mkdir(parents=True, exist_ok=True)
 
 
-settings = Settings() 
\ No newline at end of file
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Return the application settings, parsed from the environment once"""
+    return Settings()
+
+
+def ensure_dirs(s: Settings) -> None:
+    """Create upload and data directories. Called once at application startup."""
+    s.UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    Path("./data").mkdir(parents=True, exist_ok=True)
+
+
+settings = get_settings()
@@ -1,9 +1,11 @@
-import asyncio
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import DeclarativeBase
-from sqlalchemy import MetaData
+from sqlalchemy.orm import DeclarativeBase, Session
+from sqlalchemy import MetaData, JSON, event, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 from typing import AsyncGenerator
+from uuid import uuid4
 import logging
 
 from app.core.config import settings
@@ -12,15 +14,95 @@ from app.core.config import settings
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+DATABASE_BACKEND = make_url(settings.DATABASE_URL).get_backend_name()
+
+# Bump whenever the models change so create_tables() runs create_all again;
+# schema changes for existing databases ship as Alembic migrations (alembic/versions)
+SCHEMA_VERSION = 9
+
+# Module-level statements, built once and reused across calls
+PING_STMT = text("SELECT 1")
+HEALTH_STATS_STMT = text(
+    "SELECT 1, "
+    "(SELECT COUNT(*) FROM users), "
+    "(SELECT COUNT(*) FROM projects), "
+    "(SELECT COUNT(*) FROM documents), "
+    "(SELECT COUNT(*) FROM chat_messages)"
+)
+
+# Applied to every new SQLite connection
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",  # 256 MB memory-mapped reads
+    "PRAGMA cache_size=-65536",  # 64 MB page cache
+)
+
+
+def _engine_options() -> dict:
+    """Build connection pool options for the configured database backend"""
+    if DATABASE_BACKEND == "sqlite":
+        # sqlite+aiosqlite does not benefit from pooling file handles,
+        # and a pre-ping would cost an extra SELECT 1 per checkout
+        return {
+            "poolclass": NullPool,
+            "connect_args": {"check_same_thread": False},
+        }
+
+    # Pin the asyncio-aware queue pool: a plain QueuePool blocks the event loop
+    # while waiting for a free connection
+    options = {
+        "poolclass": AsyncAdaptedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+    if DATABASE_BACKEND == "postgresql" and settings.DB_PGBOUNCER:
+        # Transaction pooling hands each transaction a different server connection:
+        # asyncpg prepared statements must not be cached or reuse names, and
+        # PgBouncer rejects unknown startup parameters such as keepalive settings
+        options["connect_args"] = {
+            "statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    elif DATABASE_BACKEND == "postgresql":
+        # Keep idle asyncpg connections alive so the pool does not churn
+        options["connect_args"] = {
+            "server_settings": {
+                "tcp_keepalives_idle": str(settings.DB_TCP_KEEPALIVES_IDLE),
+                "tcp_keepalives_interval": str(settings.DB_TCP_KEEPALIVES_INTERVAL),
+                "tcp_keepalives_count": str(settings.DB_TCP_KEEPALIVES_COUNT),
+            }
+        }
+
+    return options
+
+
 # Create async engine
 engine = create_async_engine(
     settings.DATABASE_URL,
     echo=settings.DATABASE_ECHO,
     future=True,
-    pool_pre_ping=True,
-    pool_recycle=300,
+    query_cache_size=settings.DB_QUERY_CACHE_SIZE,
+    **_engine_options(),
 )
 
+
+if DATABASE_BACKEND == "sqlite":
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """Enable WAL mode, relaxed fsync and memory-mapped I/O on each new SQLite connection"""
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in SQLITE_PRAGMAS:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
 # Create async session factory
 AsyncSessionLocal = async_sessionmaker(
     engine,
@@ -30,6 +112,10 @@ AsyncSessionLocal = async_sessionmaker(
     autocommit=False,
 )
 
+# JSON column type stored as binary, indexable JSONB on Postgres
+JSONVariant = JSON().with_variant(JSONB(), "postgresql")
+
+
 # Create declarative base
 class Base(DeclarativeBase):
     """Base class for all database models"""
@@ -44,15 +130,39 @@ class Base(DeclarativeBase):
     )
 
 
+# Track whether a session has written anything since its last commit,
+# so read-only requests can end without an empty COMMIT
+@event.listens_for(Session, "after_flush")
+def _mark_flush_writes(session, flush_context):
+    session.info["has_writes"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_statement_writes(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["has_writes"] = True
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_soft_rollback")
+def _reset_writes(session, *args):
+    session.info.pop("has_writes", None)
+
+
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     """
     Dependency function to get async database session.
     Use this in FastAPI endpoints with Depends(get_async_session).
+    Commits on exit only if the session has pending or flushed writes.
     """
     async with AsyncSessionLocal() as session:
         try:
             yield session
-            await session.commit()
+            if session.in_transaction():
+                if session.new or session.dirty or session.deleted or session.info.get("has_writes"):
+                    await session.commit()
+                else:
+                    await session.rollback()
         except Exception as e:
             await session.rollback()
             logger.error(f"Database session error: {e}")
@@ -61,10 +171,44 @@ async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
             await session.close()
 
 
+async def get_readonly_session() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependency function to get a read-only database session.
+    Runs in autocommit mode, so no transaction is opened or committed.
+    """
+    async with AsyncSessionLocal() as session:
+        try:
+            await session.connection(execution_options={"isolation_level": "AUTOCOMMIT"})
+            yield session
+        finally:
+            await session.close()
+
+
+async def _get_schema_version(conn) -> int:
+    """Read the schema version recorded by the last create_tables() run"""
+    if DATABASE_BACKEND == "sqlite":
+        return await conn.scalar(text("PRAGMA user_version"))
+    
+    await conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+    return await conn.scalar(text("SELECT MAX(version) FROM schema_version")) or 0
+
+
+async def _set_schema_version(conn, version: int) -> None:
+    """Record the current schema version"""
+    if DATABASE_BACKEND == "sqlite":
+        await conn.exec_driver_sql(f"PRAGMA user_version = {int(version)}")
+        return
+    
+    await conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+    await conn.execute(text("DELETE FROM schema_version"))
+    await conn.execute(text("INSERT INTO schema_version (version) VALUES (:version)"), {"version": version})
+
+
 async def create_tables():
     """
     Create all database tables.
     This function is called during application startup.
+    Skipped when the recorded schema version is already current.
     """
     try:
         # Import all models to ensure they are registered with Base
@@ -73,11 +217,16 @@ async def create_tables():
         from app.models.document import Document
         from app.models.chat import ChatMessage
         
-        logger.info("Creating database tables...")
-        
         async with engine.begin() as conn:
-            # Create all tables
+            if await _get_schema_version(conn) == SCHEMA_VERSION:
+                logger.info("Database schema is up to date")
+                return
+            
+            logger.info("Creating database tables...")
+            
+            # Create all tables and record the version in one transaction
             await conn.run_sync(Base.metadata.create_all)
+            await _set_schema_version(conn, SCHEMA_VERSION)
             
         logger.info("✅ Database tables created successfully")
         
@@ -90,12 +239,17 @@ async def drop_tables():
     """
     Drop all database tables.
     Use with caution - this will delete all data!
+    Not available in production.
     """
+    if settings.ENVIRONMENT == "production":
+        raise RuntimeError("drop_tables() is disabled in production")
+    
     try:
         logger.warning("Dropping all database tables...")
         
         async with engine.begin() as conn:
             await conn.run_sync(Base.metadata.drop_all)
+            await _set_schema_version(conn, 0)
             
         logger.info("✅ Database tables dropped successfully")
         
@@ -108,7 +262,11 @@ async def reset_database():
     """
     Reset database by dropping and recreating all tables.
     Use with caution - this will delete all data!
+    Not available in production.
     """
+    if settings.ENVIRONMENT == "production":
+        raise RuntimeError("reset_database() is disabled in production")
+    
     try:
         logger.warning("Resetting database...")
         await drop_tables()
@@ -127,9 +285,7 @@ async def check_database_connection():
     """
     try:
         async with engine.begin() as conn:
-            # Use text() for raw SQL with SQLAlchemy 2.0
-            from sqlalchemy import text
-            await conn.execute(text("SELECT 1"))
+            await conn.execute(PING_STMT)
         logger.info("✅ Database connection successful")
         return True
     except Exception as e:
@@ -154,31 +310,19 @@ async def health_check() -> dict:
     """
     try:
         async with AsyncSessionLocal() as session:
-            # Basic connection test
-            result = await session.execute("SELECT 1")
-            connection_ok = result.scalar() == 1
-            
-            # Get basic table info
-            from app.models.user import User
-            from app.models.project import Project
-            from app.models.document import Document
-            from app.models.chat import ChatMessage
-            
-            # Count records in main tables
-            from sqlalchemy import text
-            user_count = await session.execute(text("SELECT COUNT(*) FROM users"))
-            project_count = await session.execute(text("SELECT COUNT(*) FROM projects"))
-            document_count = await session.execute(text("SELECT COUNT(*) FROM documents"))
-            message_count = await session.execute(text("SELECT COUNT(*) FROM chat_messages"))
+            # Connection test and table counts in a single round-trip
+            result = await session.execute(HEALTH_STATS_STMT)
+            ping, user_count, project_count, document_count, message_count = result.one()
+            connection_ok = ping == 1
             
             return {
                 "status": "healthy" if connection_ok else "unhealthy",
                 "connection": connection_ok,
                 "statistics": {
-                    "users": user_count.scalar(),
-                    "projects": project_count.scalar(),
-                    "documents": document_count.scalar(),
-                    "messages": message_count.scalar()
+                    "users": user_count,
+                    "projects": project_count,
+                    "documents": document_count,
+                    "messages": message_count
                 }
             }
     except Exception as e:
@@ -187,10 +331,4 @@ async def health_check() -> dict:
             "status": "unhealthy",
             "connection": False,
             "error": str(e)
-        }
-
-
-# Initialize database on module import
-if __name__ == "__main__":
-    # This allows running the file directly to create tables
-    asyncio.run(create_tables()) 
\ No newline at end of file
+        } 
\ No newline at end of file
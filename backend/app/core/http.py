@@ -0,0 +1,42 @@
+import httpx
+from importlib.util import find_spec
+from typing import Optional
+
+# Shared HTTP client for outbound AI provider calls.
+# Reusing one client keeps TCP/TLS connections alive between requests.
+_http_client: Optional[httpx.AsyncClient] = None
+
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=50, max_connections=200)
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+
+# HTTP/2 multiplexes concurrent requests to the same TLS host (e.g. Groq) over
+# one connection; it needs the optional h2 package (httpx[http2])
+HTTP2_AVAILABLE = find_spec("h2") is not None
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Create the shared HTTP client. Called once at application startup."""
+    global _http_client
+    
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(http2=HTTP2_AVAILABLE, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+    
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Close the shared HTTP client. Called once at application shutdown."""
+    global _http_client
+    
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+async def get_http_client() -> httpx.AsyncClient:
+    """
+    Dependency function to get the shared HTTP client.
+    Use this in FastAPI endpoints with Depends(get_http_client).
+    Outside the app lifespan (e.g. the background worker) the client is created on first use.
+    """
+    return create_http_client()
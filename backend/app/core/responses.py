@@ -0,0 +1,13 @@
+from typing import Union
+
+from fastapi import Response, status
+
+
+def json_response(content: Union[str, bytes], status_code: int = status.HTTP_200_OK) -> Response:
+    """
+    Return JSON already serialized by pydantic (model_dump_json / TypeAdapter.dump_json).
+    FastAPI passes Response objects through untouched, so the payload is not
+    validated against response_model and encoded a second time; keep
+    response_model on the route for the OpenAPI schema.
+    """
+    return Response(content=content, status_code=status_code, media_type="application/json")
@@ -1,9 +1,10 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, JSON
-from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy import Integer, String, DateTime, Text, ForeignKey, Index, Enum as SQLEnum, event, text
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+from datetime import datetime
+from typing import Any, List, Optional
 from enum import Enum
 
-from app.core.database import Base
+from app.core.database import Base, JSONVariant
 
 
 class MessageType(str, Enum):
@@ -12,32 +13,48 @@ class MessageType(str, Enum):
     SYSTEM = "system"
 
 
+PREVIEW_LENGTH = 100
+
+
+def make_preview(content: str) -> str:
+    """Return content truncated to PREVIEW_LENGTH characters for display"""
+    if len(content) <= PREVIEW_LENGTH:
+        return content
+    return content[:PREVIEW_LENGTH - 3] + "..."
+
+
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
+    # Fetch server-generated id/timestamps with INSERT/UPDATE ... RETURNING, no refresh needed
+    __mapper_args__ = {"eager_defaults": True}
 
-    id = Column(Integer, primary_key=True, index=True)
-    content = Column(Text, nullable=False)
-    message_type = Column(String(10), nullable=False)  # user, ai, system
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    content: Mapped[str] = mapped_column(Text, nullable=False)
+    preview: Mapped[Optional[str]] = mapped_column(String(PREVIEW_LENGTH), nullable=True)  # Precomputed truncated content
+    message_type: Mapped[MessageType] = mapped_column(
+        SQLEnum(MessageType, name="message_type_enum", values_callable=lambda e: [m.value for m in e]),
+        nullable=False
+    )  # user, ai, system
     
     # Context and metadata
-    context_documents = Column(JSON, nullable=True)  # Document IDs used for context
-    ai_model = Column(String(50), nullable=True)  # deepseek-r1:latest, etc.
-    tokens_used = Column(Integer, nullable=True)
-    processing_time_ms = Column(Integer, nullable=True)
+    context_documents: Mapped[Optional[List[int]]] = mapped_column(JSONVariant, nullable=True)  # Document IDs used for context
+    ai_model: Mapped[Optional[str]] = mapped_column(String(50), nullable=True)  # deepseek-r1:latest, etc.
+    tokens_used: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    processing_time_ms: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     
     # RAG metadata
-    retrieved_chunks = Column(JSON, nullable=True)  # Vector search results
-    confidence_score = Column(JSON, nullable=True)  # Response confidence
+    retrieved_chunks: Mapped[Optional[List[Any]]] = mapped_column(JSONVariant, nullable=True)  # Vector search results
+    confidence_score: Mapped[Optional[Any]] = mapped_column(JSONVariant, nullable=True)  # Response confidence
     
     # Timestamps
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=text("CURRENT_TIMESTAMP"), nullable=False)
     
     # Relationships
-    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
-    project = relationship("Project", back_populates="chat_messages")
+    project_id: Mapped[int] = mapped_column(Integer, ForeignKey("projects.id"), nullable=False)
+    project: Mapped["Project"] = relationship("Project", back_populates="chat_messages")
     
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    user = relationship("User")
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
+    user: Mapped["User"] = relationship("User")
     
     def __repr__(self) -> str:
         return f"<ChatMessage(id={self.id}, type='{self.message_type}', project_id={self.project_id})>"
@@ -53,6 +70,32 @@ class ChatMessage(Base):
     @property
     def truncated_content(self) -> str:
         """Return truncated content for display"""
-        if len(self.content) <= 100:
-            return self.content
-        return self.content[:97] + "..." 
\ No newline at end of file
+        if self.preview is not None:
+            return self.preview
+        return make_preview(self.content)
+
+
+# Chat timeline: messages of a project, newest first; messages saved in the same
+# transaction share created_at, so the id breaks the tie
+Index(
+    "ix_chat_messages_project_id_created_at_id",
+    ChatMessage.project_id,
+    ChatMessage.created_at.desc(),
+    ChatMessage.id.desc(),
+)
+
+# Per-type counts in the chat stats aggregate
+Index("ix_chat_messages_project_id_message_type", ChatMessage.project_id, ChatMessage.message_type)
+
+# Containment lookups on cited chunks (Postgres only)
+Index(
+    "ix_chat_messages_retrieved_chunks_gin",
+    ChatMessage.retrieved_chunks,
+    postgresql_using="gin",
+).ddl_if(dialect="postgresql")
+
+
+@event.listens_for(ChatMessage, "before_insert")
+def _set_preview(mapper, connection, target: ChatMessage) -> None:
+    """Store the display preview once at insert time"""
+    target.preview = make_preview(target.content)
@@ -1,9 +1,11 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Boolean, JSON
+from sqlalchemy import DDL, Integer, String, DateTime, Text, ForeignKey, Boolean, JSON, Index, Enum as SQLEnum, event, text
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
 from enum import Enum
 
-from app.core.database import Base
+from app.core.database import Base, JSONVariant
 
 
 class DocumentStatus(str, Enum):
@@ -17,40 +19,45 @@ class DocumentStatus(str, Enum):
 
 class Document(Base):
     __tablename__ = "documents"
+    __mapper_args__ = {"eager_defaults": True}
 
-    id = Column(Integer, primary_key=True, index=True)
-    filename = Column(String(255), nullable=False)
-    original_filename = Column(String(255), nullable=False)
-    file_path = Column(String(500), nullable=False)
-    file_size = Column(Integer, nullable=False)  # in bytes
-    file_type = Column(String(10), nullable=False)  # .pdf, .docx, etc.
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    filename: Mapped[str] = mapped_column(String(255), nullable=False)
+    original_filename: Mapped[str] = mapped_column(String(255), nullable=False)
+    file_path: Mapped[str] = mapped_column(String(500), nullable=False)
+    file_size: Mapped[int] = mapped_column(Integer, nullable=False)  # in bytes
+    file_type: Mapped[str] = mapped_column(String(10), nullable=False)  # .pdf, .docx, etc.
     
-    # Content
-    extracted_text = Column(Text, nullable=True)
-    page_count = Column(Integer, nullable=True)
+    # Content (deferred: loaded only when accessed or undeferred in the query)
+    extracted_text: Mapped[Optional[str]] = mapped_column(Text, nullable=True, deferred=True)
+    page_count: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     
     # Status
-    status = Column(String(20), default=DocumentStatus.UPLOADED, nullable=False)
-    is_analyzed = Column(Boolean, default=False, nullable=False)
+    status: Mapped[DocumentStatus] = mapped_column(
+        SQLEnum(DocumentStatus, name="document_status_enum"),
+        default=DocumentStatus.UPLOADED,
+        nullable=False
+    )
+    is_analyzed: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
     
     # Analysis results
-    analysis_result = Column(JSON, nullable=True)  # Store AI analysis results
-    central_thesis = Column(Text, nullable=True)
-    key_concepts = Column(JSON, nullable=True)  # List of key concepts
-    argumentative_structure = Column(JSON, nullable=True)  # Document structure
-    cited_sources = Column(JSON, nullable=True)  # Bibliography and citations
+    analysis_result: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSONVariant, nullable=True, deferred=True)  # Store AI analysis results
+    central_thesis: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    key_concepts: Mapped[Optional[List[str]]] = mapped_column(JSONVariant, nullable=True)  # List of key concepts
+    argumentative_structure: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSON, nullable=True)  # Document structure
+    cited_sources: Mapped[Optional[List[Any]]] = mapped_column(JSON, nullable=True)  # Bibliography and citations
     
     # Error handling
-    error_message = Column(Text, nullable=True)
+    error_message: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     
     # Timestamps
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
-    analyzed_at = Column(DateTime(timezone=True), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=text("CURRENT_TIMESTAMP"), nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=text("CURRENT_TIMESTAMP"), onupdate=func.now(), nullable=False)
+    analyzed_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
     
     # Relationships
-    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
-    project = relationship("Project", back_populates="documents")
+    project_id: Mapped[int] = mapped_column(Integer, ForeignKey("projects.id"), nullable=False)
+    project: Mapped["Project"] = relationship("Project", back_populates="documents")
     
     def __repr__(self) -> str:
         return f"<Document(id={self.id}, filename='{self.filename}', status='{self.status}')>"
@@ -77,7 +84,7 @@ class Document(Base):
         """Mark document as analyzed and store results"""
         self.status = DocumentStatus.ANALYZED
         self.is_analyzed = True
-        self.analyzed_at = func.now()
+        self.analyzed_at = datetime.now(timezone.utc)
         self.analysis_result = analysis_data
         
         # Extract specific analysis fields
@@ -88,4 +95,53 @@ class Document(Base):
         if "argumentative_structure" in analysis_data:
             self.argumentative_structure = analysis_data["argumentative_structure"]
         if "cited_sources" in analysis_data:
-            self.cited_sources = analysis_data["cited_sources"] 
\ No newline at end of file
+            self.cited_sources = analysis_data["cited_sources"] 
+
+
+Index("ix_documents_project_id_status", Document.project_id, Document.status)
+Index("ix_documents_project_id_is_analyzed", Document.project_id, Document.is_analyzed)
+Index("ix_documents_project_id_created_at", Document.project_id, Document.created_at.desc())
+Index("ix_documents_status_id", Document.status, Document.id)
+
+
+# Project document counters and progress are kept in sync by triggers on documents
+def _project_counts_update(row: str, sign: str) -> str:
+    """UPDATE applying one document row (NEW or OLD) to its project's counters"""
+    document_delta = f"{sign}1"
+    analyzed_delta = f"{sign}(CASE WHEN {row}.is_analyzed THEN 1 ELSE 0 END)"
+    return (
+        f"UPDATE projects SET "
+        f"document_count = document_count {document_delta}, "
+        f"analyzed_document_count = analyzed_document_count {analyzed_delta}, "
+        f"progress = CASE WHEN document_count {document_delta} > 0 "
+        f"THEN (analyzed_document_count {analyzed_delta}) * 100.0 / (document_count {document_delta}) "
+        f"ELSE 0.0 END "
+        f"WHERE id = {row}.project_id"
+    )
+
+
+PROJECT_COUNT_TRIGGERS = {
+    "sqlite": [
+        "CREATE TRIGGER trg_documents_insert_project_counts AFTER INSERT ON documents "
+        f"BEGIN {_project_counts_update('NEW', '+')}; END",
+        "CREATE TRIGGER trg_documents_delete_project_counts AFTER DELETE ON documents "
+        f"BEGIN {_project_counts_update('OLD', '-')}; END",
+        "CREATE TRIGGER trg_documents_update_project_counts AFTER UPDATE OF is_analyzed, project_id ON documents "
+        f"BEGIN {_project_counts_update('OLD', '-')}; {_project_counts_update('NEW', '+')}; END",
+    ],
+    "postgresql": [
+        "CREATE OR REPLACE FUNCTION documents_project_counts() RETURNS trigger AS $$ "
+        "BEGIN "
+        f"IF TG_OP IN ('UPDATE', 'DELETE') THEN {_project_counts_update('OLD', '-')}; END IF; "
+        f"IF TG_OP IN ('INSERT', 'UPDATE') THEN {_project_counts_update('NEW', '+')}; END IF; "
+        "RETURN NULL; "
+        "END; $$ LANGUAGE plpgsql",
+        "CREATE TRIGGER trg_documents_project_counts "
+        "AFTER INSERT OR DELETE OR UPDATE OF is_analyzed, project_id ON documents "
+        "FOR EACH ROW EXECUTE FUNCTION documents_project_counts()",
+    ],
+}
+
+for _dialect, _statements in PROJECT_COUNT_TRIGGERS.items():
+    for _statement in _statements:
+        event.listen(Document.__table__, "after_create", DDL(_statement).execute_if(dialect=_dialect))
@@ -1,53 +1,51 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Float
+from sqlalchemy import Integer, String, DateTime, Text, ForeignKey, Float, Index, literal, select, text
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
+from typing import List, Optional
 
 from app.core.database import Base
 
 
 class Project(Base):
     __tablename__ = "projects"
+    __mapper_args__ = {"eager_defaults": True}
 
-    id = Column(Integer, primary_key=True, index=True)
-    title = Column(String(200), nullable=False)
-    description = Column(Text, nullable=True)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    title: Mapped[str] = mapped_column(String(200), nullable=False)
+    description: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     
-    # Progress tracking
-    progress = Column(Float, default=0.0, nullable=False)  # 0.0 to 100.0
+    # Progress tracking, maintained with the document counters by triggers on documents
+    progress: Mapped[float] = mapped_column(Float, default=0.0, nullable=False)  # 0.0 to 100.0
+    document_count: Mapped[int] = mapped_column(Integer, default=0, server_default=text("0"), nullable=False)
+    analyzed_document_count: Mapped[int] = mapped_column(Integer, default=0, server_default=text("0"), nullable=False)
     
     # Timestamps
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
-    last_activity = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=text("CURRENT_TIMESTAMP"), nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=text("CURRENT_TIMESTAMP"), onupdate=func.now(), nullable=False)
+    last_activity: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=text("CURRENT_TIMESTAMP"), nullable=False)
     
     # Relationships
-    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    owner = relationship("User", back_populates="projects")
-    documents = relationship("Document", back_populates="project", cascade="all, delete-orphan")
-    chat_messages = relationship("ChatMessage", back_populates="project", cascade="all, delete-orphan")
+    owner_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
+    owner: Mapped["User"] = relationship("User", back_populates="projects")
+    documents: Mapped[List["Document"]] = relationship("Document", back_populates="project", cascade="all, delete-orphan")
+    chat_messages: Mapped[List["ChatMessage"]] = relationship("ChatMessage", back_populates="project", cascade="all, delete-orphan")
     
     def __repr__(self) -> str:
         return f"<Project(id={self.id}, title='{self.title}', owner_id={self.owner_id})>"
     
-    @property
-    def document_count(self) -> int:
-        return len(self.documents)
-    
-    @property
-    def analyzed_document_count(self) -> int:
-        return len([doc for doc in self.documents if doc.is_analyzed])
+    @classmethod
+    async def is_owned_by(cls, session: AsyncSession, project_id: int, owner_id: int) -> bool:
+        """Cheap existence probe, used only to tell an empty result apart from a missing project"""
+        stmt = select(literal(1)).where(cls.id == project_id, cls.owner_id == owner_id)
+        result = await session.execute(stmt)
+        return result.scalar_one_or_none() is not None
     
     def update_activity(self) -> None:
         """Update last activity timestamp"""
         self.last_activity = datetime.utcnow()
-    
-    def calculate_progress(self) -> float:
-        """Calculate project progress based on analyzed documents"""
-        if not self.documents:
-            return 0.0
-        
-        analyzed_count = self.analyzed_document_count
-        total_count = self.document_count
-        
-        return (analyzed_count / total_count) * 100.0 if total_count > 0 else 0.0 
\ No newline at end of file
+
+
+# Project listing: a user's projects, most recently updated first
+Index("ix_projects_owner_id_updated_at", Project.owner_id, Project.updated_at.desc())
\ No newline at end of file
@@ -17,11 +17,13 @@ from app.schemas.auth import (
     TokenPayload
 )
 from app.services.auth_service import (
-    get_password_hash, 
-    verify_password, 
+    hash_password_async, 
+    verify_password_async, 
+    password_needs_rehash,
     create_access_token,
     decode_token
 )
+from app.services.user_cache import user_cache
 
 router = APIRouter()
 security = HTTPBearer()
@@ -54,13 +56,45 @@ async def get_current_user(
         print(f"[AUTH DEBUG] JWT decode error: {e}")
         raise credentials_exception
     
-    # Get user from database
-    result = await db.execute(select(User).where(User.id == int(user_id)))
-    user = result.scalar_one_or_none()
+    # Get user from the cache, falling back to the database
+    user = user_cache.get(db, int(user_id))
+    if user is None:
+        result = await db.execute(select(User).where(User.id == int(user_id)))
+        user = result.scalar_one_or_none()
+        
+        if user is None or not user.is_active:
+            raise credentials_exception
+        
+        user_cache.add(user)
     
+    return user
+
+
+# Dependency to get current user with up-to-date usage counters
+async def get_current_user_fresh(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_session)
+) -> User:
+    """
+    Get current authenticated user, reloaded from the database.
+    Use for endpoints that read or change quota counters: a cached user
+    may carry counters up to USER_CACHE_TTL seconds old.
+    """
+    result = await db.execute(
+        select(User).where(User.id == current_user.id),
+        execution_options={"populate_existing": True}
+    )
+    user = result.scalar_one_or_none()
+
     if user is None or not user.is_active:
-        raise credentials_exception
-    
+        user_cache.invalidate(current_user.id)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Credenziali non valide",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    user_cache.add(user)
     return user
 
 
@@ -93,7 +127,7 @@ async def register(
         )
     
     # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await hash_password_async(user_data.password)
     new_user = User(
         email=user_data.email,
         name=user_data.name,
@@ -105,7 +139,6 @@ async def register(
     
     db.add(new_user)
     await db.commit()
-    await db.refresh(new_user)
     
     return UserResponse(
         id=new_user.id,
@@ -129,7 +162,7 @@ async def login(
     result = await db.execute(select(User).where(User.email == user_credentials.email))
     user = result.scalar_one_or_none()
     
-    if not user or not verify_password(user_credentials.password, user.hashed_password):
+    if not user or not await verify_password_async(user_credentials.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Email o password non corretti",
@@ -142,6 +175,10 @@ async def login(
             detail="Account disattivato"
         )
     
+    # Upgrade legacy bcrypt or outdated argon2 hashes while the plain password is at hand
+    if password_needs_rehash(user.hashed_password):
+        user.hashed_password = await hash_password_async(user_credentials.password)
+    
     # Update last login
     user.last_login = datetime.utcnow()
     await db.commit()
@@ -158,7 +195,7 @@ async def login(
 
 @router.get("/me", response_model=UserResponse)
 async def get_current_user_profile(
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user_fresh)
 ) -> UserResponse:
     """Get current user profile"""
     return UserResponse(
@@ -1,14 +1,16 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Query, status
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import desc, and_
-from typing import List, Optional, Dict, Any
+from sqlalchemy import select, func, delete, desc
+from typing import List, Optional, Dict, Any, Sequence, Tuple
+import asyncio
 import logging
-import json
+import time
 from datetime import datetime
 
-from app.core.database import get_async_session
+from app.core.config import settings
+from app.core.database import get_async_session, AsyncSessionLocal
+from app.core.responses import json_response
 from app.models.chat import ChatMessage, MessageType
 from app.models.user import User
 from app.models.project import Project
@@ -16,14 +18,221 @@ from app.schemas.chat import (
     ChatMessageRequest, 
     ChatMessageResponse, 
     ChatHistoryResponse,
-    ChatContextChunk
+    BatchChatRequest,
+    BatchChatResponse,
+    ChatContextChunk,
+    ChatStreamResponse,
+    ChunkTextResponse
 )
 from app.services.ai_service import ai_service
+from app.services.vector_service import vector_service
+from app.services.semantic_cache import semantic_cache, CachedAnswer
+from app.services.ownership_cache import ensure_project_owner
 from app.routers.auth import get_current_user
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/chat", tags=["chat"])
+router = APIRouter()
+
+PROJECT_NOT_FOUND = "Project not found"
+
+# Upper bound on chunk texts fetched in one request
+MAX_CHUNK_IDS = 50
+
+
+# Upper bound on concurrent LLM generations for a single batch request
+BATCH_GENERATION_CONCURRENCY = 8
+
+
+def _cached_answer(
+    project_id: int,
+    query_embedding: Sequence[float]
+) -> Optional[Tuple[str, List[int], List[Dict[str, Any]], Dict[str, Any]]]:
+    """Look the query up in the semantic cache, returning an answer tuple on a hit"""
+    if not settings.SEMANTIC_CACHE_ENABLED:
+        return None
+    
+    cached_answer = semantic_cache.get(project_id, query_embedding)
+    if not cached_answer:
+        return None
+    
+    # Paraphrase of a recent question: reuse its answer without RAG or LLM calls
+    ai_metadata = {
+        "ai_model": "cache",
+        "cache_hit": True,
+        "tokens_used": 0,
+        "processing_time_ms": 0,
+        "confidence_score": cached_answer.confidence_score
+    }
+    return (
+        cached_answer.response,
+        list(cached_answer.context_documents),
+        list(cached_answer.retrieved_chunks),
+        ai_metadata
+    )
+
+
+def _summarize_chunks(
+    context_chunks: List[ChatContextChunk]
+) -> Tuple[List[int], List[Dict[str, Any]]]:
+    """Prepare context documents and chunks for storage"""
+    # Ordered de-duplication of the cited documents
+    context_documents = list(dict.fromkeys(chunk.document_id for chunk in context_chunks))
+    # Store references only; texts are fetched on demand via GET .../chunks
+    retrieved_chunks = [
+        {
+            "chunk_id": chunk.chunk_id,
+            "document_id": chunk.document_id,
+            "similarity_score": chunk.similarity_score
+        }
+        for chunk in context_chunks
+    ]
+    
+    return context_documents, retrieved_chunks
+
+
+def _cache_answer(
+    project_id: int,
+    query: str,
+    query_embedding: Sequence[float],
+    answer: Tuple[str, List[int], List[Dict[str, Any]], Dict[str, Any]],
+    cache_version: int,
+    conversation_history: Optional[List[Dict[str, str]]] = None
+) -> None:
+    """
+    Cache successful answers only, never the error fallback. Answers written with
+    conversation history are not cached: the key is the bare query, so a follow-up
+    in another conversation would get an answer to the wrong context.
+    """
+    ai_response_content, context_documents, retrieved_chunks, ai_metadata = answer
+    if settings.SEMANTIC_CACHE_ENABLED and not conversation_history and "error" not in ai_metadata:
+        semantic_cache.put(project_id, query_embedding, CachedAnswer(
+            query=query,
+            response=ai_response_content,
+            context_documents=context_documents,
+            retrieved_chunks=retrieved_chunks,
+            confidence_score=ai_metadata.get("confidence_score")
+        ), cache_version)
+
+
+async def _retrieve_for_query(
+    project_id: int,
+    query: str,
+    query_embedding: Sequence[float],
+    use_cache: bool = True
+) -> Tuple[Optional[Tuple[str, List[int], List[Dict[str, Any]], Dict[str, Any]]], List[ChatContextChunk], int]:
+    """
+    Return (cached_answer, [], version) on a semantic cache hit, else (None, retrieved
+    RAG chunks, version). The project's cache version is read before retrieval, so an
+    answer built on these chunks is not cached if the project changes meanwhile.
+    """
+    cache_version = semantic_cache.version(project_id)
+    cached_answer = _cached_answer(project_id, query_embedding) if use_cache else None
+    if cached_answer:
+        return cached_answer, [], cache_version
+    
+    context_chunks = await ai_service.retrieve_context(
+        project_id=project_id,
+        query=query,
+        max_chunks=5,
+        query_embedding=query_embedding
+    )
+    return None, context_chunks, cache_version
+
+
+async def _generate_answer(
+    project_id: int,
+    query: str,
+    query_embedding: Sequence[float],
+    context_chunks: List[ChatContextChunk],
+    cache_version: int,
+    conversation_history: Optional[List[Dict[str, str]]] = None
+) -> Tuple[str, List[int], List[Dict[str, Any]], Dict[str, Any]]:
+    """Generate an answer from retrieved chunks and add it to the semantic cache"""
+    ai_response_content, ai_metadata = await ai_service.generate_response(
+        user_query=query,
+        context_chunks=context_chunks,
+        conversation_history=conversation_history
+    )
+    
+    context_documents, retrieved_chunks = _summarize_chunks(context_chunks)
+    answer = (ai_response_content, context_documents, retrieved_chunks, ai_metadata)
+    _cache_answer(project_id, query, query_embedding, answer, cache_version, conversation_history)
+    
+    return answer
+
+
+async def _answer_query(
+    project_id: int,
+    query: str,
+    query_embedding: Sequence[float],
+    conversation_history: Optional[List[Dict[str, str]]] = None
+) -> Tuple[str, List[int], List[Dict[str, Any]], Dict[str, Any]]:
+    """Answer a query from the semantic cache or via RAG + generation.
+
+    Returns (response, context_documents, retrieved_chunks, ai_metadata).
+    """
+    cached_answer, context_chunks, cache_version = await _retrieve_for_query(
+        project_id, query, query_embedding, use_cache=not conversation_history
+    )
+    if cached_answer:
+        return cached_answer
+    
+    return await _generate_answer(
+        project_id, query, query_embedding, context_chunks, cache_version, conversation_history
+    )
+
+
+async def _recent_conversation(db: AsyncSession, project_id: int) -> List[Dict[str, str]]:
+    """Load the last messages of a project in the format expected by the AI service"""
+    stmt = select(ChatMessage).where(
+        ChatMessage.project_id == project_id
+    ).order_by(desc(ChatMessage.created_at), desc(ChatMessage.id)).limit(10)
+    result = await db.execute(stmt)
+    recent_messages = result.scalars().all()
+    
+    conversation_history = []
+    for msg in reversed(recent_messages):  # Reverse to get chronological order
+        role = "user" if msg.message_type == MessageType.USER else "assistant"
+        conversation_history.append({
+            "role": role,
+            "content": msg.content
+        })
+    return conversation_history
+
+
+def _sse_event(frame: ChatStreamResponse) -> str:
+    """Encode a stream frame as a server-sent event"""
+    return f"data: {frame.model_dump_json(exclude_none=True)}\n\n"
+
+
+def _build_message_pair(
+    project_id: int,
+    user_id: int,
+    query: str,
+    answer: Tuple[str, List[int], List[Dict[str, Any]], Dict[str, Any]]
+) -> Tuple[ChatMessage, ChatMessage]:
+    """Build the user and AI ChatMessage rows for one answered query"""
+    ai_response_content, context_documents, retrieved_chunks, ai_metadata = answer
+    user_message = ChatMessage(
+        content=query,
+        message_type=MessageType.USER,
+        project_id=project_id,
+        user_id=user_id
+    )
+    ai_message = ChatMessage(
+        content=ai_response_content,
+        message_type=MessageType.AI,
+        project_id=project_id,
+        user_id=user_id,
+        context_documents=context_documents,
+        ai_model=ai_metadata.get("ai_model"),
+        tokens_used=ai_metadata.get("tokens_used"),
+        processing_time_ms=ai_metadata.get("processing_time_ms"),
+        retrieved_chunks=retrieved_chunks,
+        confidence_score=ai_metadata.get("confidence_score")
+    )
+    return user_message, ai_message
 
 
 @router.post("/projects/{project_id}/messages", response_model=ChatMessageResponse)
@@ -36,146 +245,236 @@ async def send_message(
     """Send a message to AI and get response with RAG context"""
     try:
         # Verify project exists and user has access
-        project = db.query(Project).filter(
-            and_(
-                Project.id == project_id,
-                Project.owner_id == current_user.id
-            )
-        ).first()
-        
-        if not project:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Project not found"
-            )
+        await ensure_project_owner(db, project_id, current_user.id, detail=PROJECT_NOT_FOUND)
         
-        # Get recent conversation history for context
-        recent_messages = db.query(ChatMessage).filter(
-            ChatMessage.project_id == project_id
-        ).order_by(desc(ChatMessage.created_at)).limit(10).all()
-        
-        # Convert to format expected by AI service
-        conversation_history = []
-        for msg in reversed(recent_messages):  # Reverse to get chronological order
-            role = "user" if msg.message_type == MessageType.USER else "assistant"
-            conversation_history.append({
-                "role": role,
-                "content": msg.content
-            })
-        
-        # Store user message
-        user_message = ChatMessage(
-            content=message_request.content,
-            message_type=MessageType.USER,
-            project_id=project_id,
-            user_id=current_user.id
-        )
-        db.add(user_message)
-        db.commit()
-        db.refresh(user_message)
-        
-        # Retrieve context using RAG
-        context_chunks = await ai_service.retrieve_context(
-            project_id=project_id,
-            query=message_request.content,
-            max_chunks=5
+        # The history query and the query embedding are independent: overlap them
+        conversation_history, (query_embedding,) = await asyncio.gather(
+            _recent_conversation(db, project_id),
+            ai_service.embed_batch([message_request.content])
         )
         
-        # Generate AI response
-        ai_response_content, ai_metadata = await ai_service.generate_response(
-            user_query=message_request.content,
-            context_chunks=context_chunks,
-            conversation_history=conversation_history
+        # End the read transaction so no pooled connection is held during
+        # retrieval and the (slow) generation call; nothing is expired on commit
+        await db.commit()
+        
+        # Cached answers are keyed on the bare query, so they only stand in for
+        # turns without conversation history
+        answer, context_chunks, cache_version = await _retrieve_for_query(
+            project_id, message_request.content, query_embedding,
+            use_cache=not conversation_history
         )
         
-        # Prepare context documents and chunks for storage
-        context_documents = []
-        retrieved_chunks = []
+        if not answer:
+            answer = await _generate_answer(
+                project_id,
+                message_request.content,
+                query_embedding,
+                context_chunks,
+                cache_version,
+                conversation_history=conversation_history
+            )
         
-        for chunk in context_chunks:
-            if chunk.document_id not in context_documents:
-                context_documents.append(chunk.document_id)
-            
-            retrieved_chunks.append({
-                "document_id": chunk.document_id,
-                "chunk_text": chunk.chunk_text[:200] + "..." if len(chunk.chunk_text) > 200 else chunk.chunk_text,
-                "similarity_score": chunk.similarity_score,
-                "metadata": chunk.metadata
-            })
-        
-        # Store AI response
-        ai_message = ChatMessage(
-            content=ai_response_content,
-            message_type=MessageType.AI,
-            project_id=project_id,
-            user_id=current_user.id,
-            context_documents=context_documents,
-            ai_model=ai_metadata.get("ai_model"),
-            tokens_used=ai_metadata.get("tokens_used"),
-            processing_time_ms=ai_metadata.get("processing_time_ms"),
-            retrieved_chunks=retrieved_chunks,
-            confidence_score=ai_metadata.get("confidence_score")
+        # Store user message and AI response in a single transaction
+        user_message, ai_message = _build_message_pair(
+            project_id, current_user.id, message_request.content, answer
         )
-        db.add(ai_message)
-        db.commit()
-        db.refresh(ai_message)
+        db.add_all([user_message, ai_message])
+        await db.commit()
         
         logger.info(f"Chat message processed for project {project_id}, user {current_user.id}")
         
         return ChatMessageResponse.model_validate(ai_message)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing chat message: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error processing message: {str(e)}"
         )
 
 
-@router.get("/projects/{project_id}/history", response_model=ChatHistoryResponse)
-async def get_chat_history(
+@router.post("/projects/{project_id}/messages/stream")
+async def stream_message(
     project_id: int,
-    limit: int = 50,
-    offset: int = 0,
+    message_request: ChatMessageRequest,
     db: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user)
 ):
-    """Get chat history for a project"""
+    """Send a message to AI and stream the response as server-sent events"""
+    # Verify project exists and user has access
+    await ensure_project_owner(db, project_id, current_user.id, detail=PROJECT_NOT_FOUND)
+    
+    conversation_history = await _recent_conversation(db, project_id)
+    user_id = current_user.id
+    query = message_request.content
+    
+    # Release the request-scoped connection before streaming starts; the
+    # messages are persisted from a fresh session once the stream completes
+    await db.commit()
+    
+    async def event_stream():
+        start_ns = time.perf_counter_ns()
+        try:
+            query_embedding, = await ai_service.embed_batch([query])
+            # Read before retrieval, so an answer built on chunks that are
+            # invalidated during generation is not cached; cached answers only
+            # stand in for turns without conversation history
+            cache_version = semantic_cache.version(project_id)
+            answer = None if conversation_history else _cached_answer(project_id, query_embedding)
+            
+            if answer:
+                yield _sse_event(ChatStreamResponse(type="chunk", content=answer[0]))
+            else:
+                context_chunks = await ai_service.retrieve_context(
+                    project_id=project_id,
+                    query=query,
+                    max_chunks=5,
+                    query_embedding=query_embedding
+                )
+                
+                pieces = []
+                async for piece in ai_service.stream_response(
+                    user_query=query,
+                    context_chunks=context_chunks,
+                    conversation_history=conversation_history
+                ):
+                    pieces.append(piece)
+                    yield _sse_event(ChatStreamResponse(type="chunk", content=piece))
+                
+                ai_response_content = "".join(pieces)
+                ai_metadata = ai_service.build_response_metadata(ai_response_content, context_chunks, start_ns)
+                context_documents, retrieved_chunks = _summarize_chunks(context_chunks)
+                answer = (ai_response_content, context_documents, retrieved_chunks, ai_metadata)
+                _cache_answer(project_id, query, query_embedding, answer, cache_version, conversation_history)
+            
+            # Store user message and AI response in a single transaction
+            async with AsyncSessionLocal() as session:
+                user_message, ai_message = _build_message_pair(project_id, user_id, query, answer)
+                session.add_all([user_message, ai_message])
+                await session.commit()
+            
+            logger.info(f"Streamed chat message for project {project_id}, user {user_id}")
+            yield _sse_event(ChatStreamResponse(type="done", message_id=ai_message.id))
+            
+        except Exception as e:
+            logger.error(f"Error streaming chat message: {e}")
+            yield _sse_event(ChatStreamResponse(type="error", error=str(e)))
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/projects/{project_id}/messages:batch", response_model=BatchChatResponse)
+async def send_messages_batch(
+    project_id: int,
+    batch_request: BatchChatRequest,
+    db: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user)
+):
+    """Answer several independent queries at once (no conversation history), in request order"""
     try:
         # Verify project exists and user has access
-        project = db.query(Project).filter(
-            and_(
-                Project.id == project_id,
-                Project.owner_id == current_user.id
-            )
-        ).first()
+        await ensure_project_owner(db, project_id, current_user.id, detail=PROJECT_NOT_FOUND)
         
-        if not project:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Project not found"
+        # Release the pooled connection during embedding, retrieval and generation
+        await db.commit()
+        
+        queries = [message.content for message in batch_request.messages]
+        query_embeddings = await ai_service.embed_batch(queries)
+        
+        semaphore = asyncio.Semaphore(BATCH_GENERATION_CONCURRENCY)
+        
+        async def answer(query: str, query_embedding):
+            async with semaphore:
+                return await _answer_query(project_id, query, query_embedding)
+        
+        answers = await asyncio.gather(*[
+            answer(query, query_embedding)
+            for query, query_embedding in zip(queries, query_embeddings)
+        ])
+        
+        # Store every message pair in a single transaction
+        ai_messages = []
+        for query, query_answer in zip(queries, answers):
+            user_message, ai_message = _build_message_pair(
+                project_id, current_user.id, query, query_answer
             )
+            db.add_all([user_message, ai_message])
+            ai_messages.append(ai_message)
+        await db.commit()
         
-        # Get total count
-        total_count = db.query(ChatMessage).filter(
-            ChatMessage.project_id == project_id
-        ).count()
+        logger.info(f"Batch of {len(queries)} chat messages processed for project {project_id}, user {current_user.id}")
         
-        # Get messages with pagination
-        messages = db.query(ChatMessage).filter(
-            ChatMessage.project_id == project_id
-        ).order_by(desc(ChatMessage.created_at)).offset(offset).limit(limit).all()
+        return BatchChatResponse(
+            messages=[ChatMessageResponse.model_validate(message) for message in ai_messages]
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error processing chat message batch: {e}")
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error processing message batch: {str(e)}"
+        )
+
+
+@router.get("/projects/{project_id}/history", response_model=ChatHistoryResponse)
+async def get_chat_history(
+    project_id: int,
+    limit: int = 50,
+    offset: int = 0,
+    db: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user)
+):
+    """Get chat history for a project"""
+    try:
+        # Get the page of messages and the total count in one query; the join on
+        # Project enforces ownership without a separate lookup
+        stmt = select(
+            ChatMessage,
+            func.count().over().label("total_count")
+        ).join(Project).where(
+            ChatMessage.project_id == project_id,
+            Project.owner_id == current_user.id
+        ).order_by(desc(ChatMessage.created_at), desc(ChatMessage.id)).offset(offset).limit(limit)
+        result = await db.execute(stmt)
+        rows = result.all()
+        
+        messages = [row[0] for row in rows]
+        if rows:
+            total_count = rows[0].total_count
+        else:
+            # Empty page: only now check whether the project exists at all
+            await ensure_project_owner(db, project_id, current_user.id, detail=PROJECT_NOT_FOUND)
+            total_count = 0
+            if offset > 0:
+                # Page past the end: the window count is unavailable, count separately
+                count_stmt = select(func.count(ChatMessage.id)).where(
+                    ChatMessage.project_id == project_id
+                )
+                count_result = await db.execute(count_stmt)
+                total_count = count_result.scalar()
         
         # Convert to response format
         message_responses = [ChatMessageResponse.model_validate(msg) for msg in messages]
         
-        return ChatHistoryResponse(
+        response = ChatHistoryResponse(
             messages=message_responses,
             total_count=total_count,
             has_more=offset + limit < total_count
         )
+        return json_response(response.model_dump_json())
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting chat history: {e}")
         raise HTTPException(
@@ -184,6 +483,35 @@ async def get_chat_history(
         )
 
 
+@router.get("/projects/{project_id}/chunks", response_model=List[ChunkTextResponse])
+async def get_chunk_texts(
+    project_id: int,
+    ids: List[str] = Query(...),
+    db: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user)
+):
+    """Get the texts of chunks cited by AI messages, for expanding a message in the UI"""
+    if len(ids) > MAX_CHUNK_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_CHUNK_IDS} chunk ids per request"
+        )
+    
+    # Verify project exists and user has access
+    await ensure_project_owner(db, project_id, current_user.id, detail=PROJECT_NOT_FOUND)
+    
+    chunks = await asyncio.to_thread(vector_service.get_chunks, project_id, ids)
+    
+    return [
+        ChunkTextResponse(
+            chunk_id=chunk["chunk_id"],
+            document_id=chunk["metadata"].get("document_id", 0),
+            chunk_text=chunk["chunk_text"]
+        )
+        for chunk in chunks
+    ]
+
+
 @router.get("/projects/{project_id}/suggested-questions")
 async def get_suggested_questions(
     project_id: int,
@@ -193,18 +521,7 @@ async def get_suggested_questions(
     """Get suggested questions for a project"""
     try:
         # Verify project exists and user has access
-        project = db.query(Project).filter(
-            and_(
-                Project.id == project_id,
-                Project.owner_id == current_user.id
-            )
-        ).first()
-        
-        if not project:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Project not found"
-            )
+        await ensure_project_owner(db, project_id, current_user.id, detail=PROJECT_NOT_FOUND)
         
         # Generate suggested questions
         suggested_questions = await ai_service.generate_suggested_questions(
@@ -213,6 +530,8 @@ async def get_suggested_questions(
         
         return {"suggestions": suggested_questions}
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting suggested questions: {e}")
         raise HTTPException(
@@ -229,34 +548,33 @@ async def clear_chat_history(
 ):
     """Clear chat history for a project"""
     try:
-        # Verify project exists and user has access
-        project = db.query(Project).filter(
-            and_(
-                Project.id == project_id,
-                Project.owner_id == current_user.id
-            )
-        ).first()
-        
-        if not project:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Project not found"
-            )
+        # Delete all messages for this project, scoped to projects the user owns
+        owned_project = select(Project.id).where(
+            Project.id == project_id,
+            Project.owner_id == current_user.id
+        )
+        # No ChatMessage objects live in this session, so skip synchronizing it:
+        # the subquery criteria would otherwise force a 'fetch' of the deleted ids
+        stmt = delete(ChatMessage).where(
+            ChatMessage.project_id.in_(owned_project.scalar_subquery())
+        ).execution_options(synchronize_session=False)
+        result = await db.execute(stmt)
+        deleted_count = result.rowcount
         
-        # Delete all messages for this project
-        deleted_count = db.query(ChatMessage).filter(
-            ChatMessage.project_id == project_id
-        ).delete()
+        if not deleted_count:
+            await ensure_project_owner(db, project_id, current_user.id, detail=PROJECT_NOT_FOUND)
         
-        db.commit()
+        await db.commit()
         
         logger.info(f"Cleared {deleted_count} chat messages for project {project_id}")
         
         return {"message": f"Cleared {deleted_count} messages", "success": True}
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error clearing chat history: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error clearing chat history: {str(e)}"
@@ -271,48 +589,29 @@ async def get_chat_stats(
 ):
     """Get chat statistics for a project"""
     try:
-        # Verify project exists and user has access
-        project = db.query(Project).filter(
-            and_(
-                Project.id == project_id,
-                Project.owner_id == current_user.id
-            )
-        ).first()
-        
-        if not project:
+        # Get chat statistics with a single aggregate query; grouping on the owned
+        # project yields no row at all when the project is missing or not ours
+        stmt = select(
+            func.count(ChatMessage.id),
+            func.count(ChatMessage.id).filter(ChatMessage.message_type == MessageType.USER),
+            func.count(ChatMessage.id).filter(ChatMessage.message_type == MessageType.AI),
+            func.coalesce(func.sum(ChatMessage.tokens_used), 0)
+        ).select_from(Project).outerjoin(
+            ChatMessage, ChatMessage.project_id == Project.id
+        ).where(
+            Project.id == project_id,
+            Project.owner_id == current_user.id
+        ).group_by(Project.id)
+        result = await db.execute(stmt)
+        row = result.one_or_none()
+        
+        if row is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Project not found"
             )
         
-        # Get chat statistics
-        total_messages = db.query(ChatMessage).filter(
-            ChatMessage.project_id == project_id
-        ).count()
-        
-        user_messages = db.query(ChatMessage).filter(
-            and_(
-                ChatMessage.project_id == project_id,
-                ChatMessage.message_type == MessageType.USER
-            )
-        ).count()
-        
-        ai_messages = db.query(ChatMessage).filter(
-            and_(
-                ChatMessage.project_id == project_id,
-                ChatMessage.message_type == MessageType.AI
-            )
-        ).count()
-        
-        # Get total tokens used
-        total_tokens = db.query(ChatMessage).filter(
-            and_(
-                ChatMessage.project_id == project_id,
-                ChatMessage.tokens_used.isnot(None)
-            )
-        ).with_entities(ChatMessage.tokens_used).all()
-        
-        total_tokens_used = sum(tokens[0] for tokens in total_tokens if tokens[0])
+        total_messages, user_messages, ai_messages, total_tokens_used = row
         
         return {
             "total_messages": total_messages,
@@ -321,6 +620,8 @@ async def get_chat_stats(
             "total_tokens_used": total_tokens_used
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting chat stats: {e}")
         raise HTTPException(
@@ -331,5 +632,5 @@ async def get_chat_stats(
 
 @router.get("/health")
 async def chat_health():
-    """Health check for chat service"""
-    return {"status": "ok", "service": "chat"} 
+    """Health check for chat service, with semantic cache counters"""
+    return {"status": "ok", "service": "chat", "semantic_cache": semantic_cache.get_stats()} 
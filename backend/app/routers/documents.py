@@ -1,17 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, func, update
+from sqlalchemy.orm import undefer
 from typing import List, Optional
 from pathlib import Path
 
 from app.core.database import get_async_session
+from app.core.responses import json_response
 from app.models.user import User
 from app.models.project import Project
-from app.models.document import Document
+from app.models.document import Document, DocumentStatus
 from app.schemas.document import DocumentResponse, DocumentListResponse
 from app.services.document_processor import document_processor
+from app.services.semantic_cache import semantic_cache
+from app.services.ownership_cache import ensure_project_owner
 from app.services.background_processor import process_document, reprocess_document, get_processing_status, health_check
-from app.routers.auth import get_current_user
+from app.routers.auth import get_current_user, get_current_user_fresh
 
 
 router = APIRouter()
@@ -24,7 +28,7 @@ router = APIRouter()
 async def upload_document(
     project_id: int,
     file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(get_current_user_fresh),
     db: AsyncSession = Depends(get_async_session)
 ):
     """Upload a document to a specific project"""
@@ -56,36 +60,50 @@ async def upload_document(
     
     try:
         # Save file to disk
-        file_path, unique_filename = await document_processor.save_file(file, project_id)
+        file_path, unique_filename, file_size = await document_processor.save_file(file, project_id)
         
         # Create document record
         document = Document(
             filename=unique_filename,
             original_filename=file.filename,
             file_path=file_path,
-            file_size=file.size,
+            file_size=file_size,
             file_type=Path(file.filename).suffix.lower(),
             project_id=project_id,
-            status="UPLOADED"
+            status=DocumentStatus.UPLOADED
         )
         
         db.add(document)
-        await db.commit()
-        await db.refresh(document)
         
-        # Update user upload count
-        current_user.documents_uploaded += 1
-        await db.commit()
+        # Count the upload with a single UPDATE; for free users the WHERE clause
+        # re-checks the limit, so concurrent uploads cannot both pass it
+        count_stmt = update(User).where(User.id == current_user.id)
+        if not current_user.is_pro:
+            count_stmt = count_stmt.where(User.documents_uploaded < 20)
+        result = await db.execute(
+            count_stmt.values(documents_uploaded=User.documents_uploaded + 1).returning(User.id)
+        )
+        if result.scalar_one_or_none() is None:
+            document_processor.delete_file(file_path)
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Limite di 20 documenti raggiunto. Aggiorna a Pro per documenti illimitati."
+            )
         
-        # Update project activity
+        # Update project activity in the same transaction
         project.update_activity()
+        
         await db.commit()
         
         # Queue document for background processing
-        await process_document(document.id, priority=1)
+        await process_document(document.id)
         
         return DocumentResponse.model_validate(document)
         
+    except HTTPException:
+        # save_file already removed any partial file, and a refused count
+        # removed the saved one
+        raise
     except Exception as e:
         # Clean up on error
         if 'file_path' in locals():
@@ -106,40 +124,39 @@ async def list_project_documents(
 ):
     """List documents in a specific project"""
     
-    # Check if project exists and user owns it
-    stmt = select(Project).where(
-        Project.id == project_id,
-        Project.owner_id == current_user.id
-    )
-    result = await db.execute(stmt)
-    project = result.scalar_one_or_none()
-    
-    if not project:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Progetto non trovato"
-        )
-    
-    # Get documents with pagination
+    # Get documents with pagination and the total count in one query; the join
+    # on Project enforces ownership without a separate lookup
     offset = (page - 1) * per_page
-    stmt = select(Document).where(
-        Document.project_id == project_id
+    stmt = select(
+        Document,
+        func.count().over().label("total")
+    ).join(Project).where(
+        Document.project_id == project_id,
+        Project.owner_id == current_user.id
     ).order_by(Document.created_at.desc()).offset(offset).limit(per_page)
     
     result = await db.execute(stmt)
-    documents = result.scalars().all()
-    
-    # Get total count
-    count_stmt = select(func.count(Document.id)).where(Document.project_id == project_id)
-    count_result = await db.execute(count_stmt)
-    total = count_result.scalar()
-    
-    return DocumentListResponse(
+    rows = result.all()
+    documents = [row[0] for row in rows]
+    
+    if rows:
+        total = rows[0].total
+    else:
+        # Empty page: only now check whether the project exists at all
+        await ensure_project_owner(db, project_id, current_user.id)
+        total = 0
+        if offset > 0:
+            count_stmt = select(func.count(Document.id)).where(Document.project_id == project_id)
+            count_result = await db.execute(count_stmt)
+            total = count_result.scalar()
+    
+    response = DocumentListResponse(
         documents=[DocumentResponse.model_validate(doc) for doc in documents],
         total=total,
         page=page,
         per_page=per_page
     )
+    return json_response(response.model_dump_json())
 
 
 @router.get("/{document_id}", response_model=DocumentResponse)
@@ -169,7 +186,7 @@ async def get_document(
 @router.delete("/{document_id}")
 async def delete_document(
     document_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(get_current_user_fresh),
     db: AsyncSession = Depends(get_async_session)
 ):
     """Delete a document"""
@@ -190,12 +207,17 @@ async def delete_document(
     # Delete file from disk
     document_processor.delete_file(document.file_path)
     
-    # Delete from database
-    await db.delete(document)
-    await db.commit()
+    # Answers cached for this project may cite the deleted document
+    semantic_cache.invalidate_project(document.project_id)
     
-    # Update user document count
-    current_user.documents_uploaded = max(0, current_user.documents_uploaded - 1)
+    # Delete from database and update user document count in one transaction
+    await db.delete(document)
+    await db.execute(
+        update(User).where(
+            User.id == current_user.id,
+            User.documents_uploaded > 0
+        ).values(documents_uploaded=User.documents_uploaded - 1)
+    )
     await db.commit()
     
     return {"message": "Documento eliminato con successo"}
@@ -207,7 +229,7 @@ async def reprocess_document_endpoint(
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_async_session)
 ):
-    """Reprocess a document (re-extract text and re-analyze)"""
+    """Reprocess a document (re-chunk, re-embed and re-analyze its stored text)"""
     
     stmt = select(Document).join(Project).where(
         Document.id == document_id,
@@ -222,10 +244,8 @@ async def reprocess_document_endpoint(
             detail="Documento non trovato"
         )
     
-    # Reset document status
-    document.status = "UPLOADED"
-    document.extracted_text = None
-    document.page_count = None
+    # Reset document status; the extracted text is kept and reused
+    document.status = DocumentStatus.UPLOADED
     document.error_message = None
     document.is_analyzed = False
     document.analysis_result = None
@@ -246,7 +266,7 @@ async def get_document_text(
 ):
     """Get extracted text from a document"""
     
-    stmt = select(Document).join(Project).where(
+    stmt = select(Document).options(undefer(Document.extracted_text)).join(Project).where(
         Document.id == document_id,
         Project.owner_id == current_user.id
     )
@@ -308,16 +328,33 @@ async def get_processing_health(
     return health_info
 
 
+@router.get("/processing/health/deep")
+async def get_processing_deep_health(
+    current_user: User = Depends(get_current_user)
+):
+    """Health check for the background processor, including the vector database"""
+    
+    # Only allow pro users or admins to check health
+    if not current_user.is_pro:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Accesso riservato agli utenti Pro"
+        )
+    
+    health_info = await health_check(deep=True)
+    return health_info
+
+
 @router.post("/{document_id}/analyze")
 async def analyze_document_endpoint(
     document_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(get_current_user_fresh),
     db: AsyncSession = Depends(get_async_session)
 ):
     """Manually trigger AI analysis for a document"""
     
     # Check if user owns the document
-    stmt = select(Document).join(Project).where(
+    stmt = select(Document).options(undefer(Document.extracted_text)).join(Project).where(
         Document.id == document_id,
         Project.owner_id == current_user.id
     )
@@ -338,7 +375,7 @@ async def analyze_document_endpoint(
         )
     
     # Check rate limits for free users
-    if not current_user.is_pro and current_user.ai_queries_today >= 50:
+    if not current_user.is_pro and current_user.ai_questions_today >= 50:
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail="Limite giornaliero di 50 analisi raggiunto. Aggiorna a Pro per analisi illimitate."
@@ -354,21 +391,34 @@ async def analyze_document_endpoint(
             filename=document.original_filename
         )
         
+        # Count the analysis for free users with a single UPDATE that re-checks
+        # the limit, so concurrent analyses cannot both pass it; the analysis
+        # is only stored if the count went through
+        if not current_user.is_pro:
+            result = await db.execute(
+                update(User).where(
+                    User.id == current_user.id,
+                    User.ai_questions_today < 50
+                ).values(ai_questions_today=User.ai_questions_today + 1).returning(User.id)
+            )
+            if result.scalar_one_or_none() is None:
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Limite giornaliero di 50 analisi raggiunto. Aggiorna a Pro per analisi illimitate."
+                )
+        
         # Update document with analysis results
         document.mark_as_analyzed(analysis_result)
         await db.commit()
         
-        # Update user AI usage count
-        if not current_user.is_pro:
-            current_user.ai_queries_today += 1
-            await db.commit()
-        
         return {
             "message": "Analisi completata con successo",
             "document_id": document.id,
             "analysis_result": analysis_result
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -385,7 +435,7 @@ async def get_document_analysis(
     """Get AI analysis results for a document"""
     
     # Check if user owns the document
-    stmt = select(Document).join(Project).where(
+    stmt = select(Document).options(undefer(Document.analysis_result)).join(Project).where(
         Document.id == document_id,
         Project.owner_id == current_user.id
     )
@@ -1,40 +1,52 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import delete, select, update
+from datetime import datetime
 from typing import List
 
 from app.core.database import get_async_session
+from app.core.responses import json_response
 from app.models.user import User
 from app.models.project import Project
-from app.schemas.project import ProjectCreate, ProjectUpdate, ProjectResponse
+from app.models.document import Document
+from app.models.chat import ChatMessage
+from app.schemas.project import ProjectCreate, ProjectUpdate, ProjectResponse, ProjectResponseList
 from app.services.background_processor import process_project_documents
-from app.routers.auth import get_current_user
+from app.services.ownership_cache import ownership_cache
+from app.routers.auth import get_current_user, get_current_user_fresh
 
 
 router = APIRouter()
 
 
+# Plain project columns: rows expose them as attributes matching ProjectResponse
+# fields, so read endpoints can validate rows without building ORM instances
+PROJECT_COLUMNS = tuple(Project.__table__.columns)
+
+
 @router.post("/", response_model=ProjectResponse, status_code=status.HTTP_201_CREATED)
 async def create_project(
     project: ProjectCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(get_current_user_fresh),
     db: AsyncSession = Depends(get_async_session)
 ):
     """Create a new project"""
     
-    # Check if free user has reached project limit
+    # Count the project with a single UPDATE; for free users the WHERE clause
+    # checks the limit, so concurrent creates cannot both pass it
+    count_stmt = update(User).where(User.id == current_user.id)
     if not current_user.is_pro:
-        stmt = select(func.count(Project.id)).where(Project.owner_id == current_user.id)
-        result = await db.execute(stmt)
-        project_count = result.scalar()
-        
-        if project_count >= 5:  # Free user limit
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Limite di 5 progetti raggiunto. Aggiorna a Pro per progetti illimitati."
-            )
+        count_stmt = count_stmt.where(User.project_count < 5)  # Free user limit
+    result = await db.execute(
+        count_stmt.values(project_count=User.project_count + 1).returning(User.id)
+    )
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Limite di 5 progetti raggiunto. Aggiorna a Pro per progetti illimitati."
+        )
     
-    # Create project
+    # Create project in the same transaction as the count
     db_project = Project(
         title=project.title,
         description=project.description,
@@ -43,21 +55,10 @@ async def create_project(
     
     db.add(db_project)
     await db.commit()
-    await db.refresh(db_project)
     
-    # Manually create response with computed fields for new project
-    return ProjectResponse(
-        id=db_project.id,
-        title=db_project.title,
-        description=db_project.description,
-        progress=db_project.progress,
-        created_at=db_project.created_at,
-        updated_at=db_project.updated_at,
-        last_activity=db_project.last_activity,
-        owner_id=db_project.owner_id,
-        document_count=0,  # New project has no documents
-        analyzed_document_count=0  # New project has no analyzed documents
-    )
+    # Server defaults (including the zeroed document counters) come back
+    # through INSERT ... RETURNING (eager_defaults)
+    return ProjectResponse.model_validate(db_project)
 
 
 @router.get("/", response_model=List[ProjectResponse])
@@ -67,29 +68,14 @@ async def list_projects(
 ):
     """List all projects for the current user"""
     
-    # Get projects with document counts using a join
-    from sqlalchemy.orm import selectinload
-    stmt = select(Project).options(selectinload(Project.documents)).where(Project.owner_id == current_user.id).order_by(Project.updated_at.desc())
+    # Document counts are stored on the project row, so no aggregation is needed
+    stmt = select(*PROJECT_COLUMNS).where(
+        Project.owner_id == current_user.id
+    ).order_by(Project.updated_at.desc())
     result = await db.execute(stmt)
-    projects = result.scalars().all()
-    
-    # Manually build response objects with computed fields
-    project_responses = []
-    for project in projects:
-        project_responses.append(ProjectResponse(
-            id=project.id,
-            title=project.title,
-            description=project.description,
-            progress=project.progress,
-            created_at=project.created_at,
-            updated_at=project.updated_at,
-            last_activity=project.last_activity,
-            owner_id=project.owner_id,
-            document_count=len(project.documents),
-            analyzed_document_count=len([doc for doc in project.documents if doc.is_analyzed])
-        ))
     
-    return project_responses
+    projects = ProjectResponseList.validate_python(result.all(), from_attributes=True)
+    return json_response(ProjectResponseList.dump_json(projects))
 
 
 @router.get("/{project_id}", response_model=ProjectResponse)
@@ -100,33 +86,21 @@ async def get_project(
 ):
     """Get a specific project"""
     
-    # Get project with documents loaded
-    from sqlalchemy.orm import selectinload
-    stmt = select(Project).options(selectinload(Project.documents)).where(
+    stmt = select(*PROJECT_COLUMNS).where(
         Project.id == project_id,
         Project.owner_id == current_user.id
     )
     result = await db.execute(stmt)
-    project = result.scalar_one_or_none()
+    row = result.one_or_none()
     
-    if not project:
+    if row is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Progetto non trovato"
         )
     
-    return ProjectResponse(
-        id=project.id,
-        title=project.title,
-        description=project.description,
-        progress=project.progress,
-        created_at=project.created_at,
-        updated_at=project.updated_at,
-        last_activity=project.last_activity,
-        owner_id=project.owner_id,
-        document_count=len(project.documents),
-        analyzed_document_count=len([doc for doc in project.documents if doc.is_analyzed])
-    )
+    project = ProjectResponse.model_validate(row, from_attributes=True)
+    return json_response(project.model_dump_json())
 
 
 @router.put("/{project_id}", response_model=ProjectResponse)
@@ -138,73 +112,74 @@ async def update_project(
 ):
     """Update a project"""
     
-    stmt = select(Project).where(
+    # Ownership is proven by the UPDATE itself matching a row, and RETURNING
+    # hands back the updated project without a preliminary SELECT
+    values = project_update.model_dump(exclude_none=True)
+    values["last_activity"] = datetime.utcnow()
+    
+    stmt = update(Project).where(
         Project.id == project_id,
         Project.owner_id == current_user.id
-    )
+    ).values(**values).returning(*PROJECT_COLUMNS).execution_options(synchronize_session=False)
     result = await db.execute(stmt)
-    project = result.scalar_one_or_none()
+    row = result.one_or_none()
     
-    if not project:
+    if row is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Progetto non trovato"
         )
     
-    # Update fields
-    if project_update.title is not None:
-        project.title = project_update.title
-    if project_update.description is not None:
-        project.description = project_update.description
-    
-    project.update_activity()
-    
     await db.commit()
-    await db.refresh(project)
-    
-    # Load documents for computed fields
-    from sqlalchemy.orm import selectinload
-    stmt = select(Project).options(selectinload(Project.documents)).where(Project.id == project.id)
-    result = await db.execute(stmt)
-    updated_project = result.scalar_one()
     
-    return ProjectResponse(
-        id=updated_project.id,
-        title=updated_project.title,
-        description=updated_project.description,
-        progress=updated_project.progress,
-        created_at=updated_project.created_at,
-        updated_at=updated_project.updated_at,
-        last_activity=updated_project.last_activity,
-        owner_id=updated_project.owner_id,
-        document_count=len(updated_project.documents),
-        analyzed_document_count=len([doc for doc in updated_project.documents if doc.is_analyzed])
-    )
+    return ProjectResponse.model_validate(row, from_attributes=True)
 
 
 @router.delete("/{project_id}")
 async def delete_project(
     project_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(get_current_user_fresh),
     db: AsyncSession = Depends(get_async_session)
 ):
     """Delete a project"""
     
-    stmt = select(Project).where(
+    # Bulk-delete the project's messages and documents, then the project itself;
+    # every statement is scoped to projects the user owns, and RETURNING on the
+    # last one tells a missing project apart without a preliminary SELECT
+    owned_project = select(Project.id).where(
         Project.id == project_id,
         Project.owner_id == current_user.id
+    ).scalar_subquery()
+    await db.execute(
+        delete(ChatMessage).where(ChatMessage.project_id == owned_project),
+        execution_options={"synchronize_session": False}
+    )
+    await db.execute(
+        delete(Document).where(Document.project_id == owned_project),
+        execution_options={"synchronize_session": False}
+    )
+    result = await db.execute(
+        delete(Project).where(
+            Project.id == project_id,
+            Project.owner_id == current_user.id
+        ).returning(Project.id),
+        execution_options={"synchronize_session": False}
     )
-    result = await db.execute(stmt)
-    project = result.scalar_one_or_none()
     
-    if not project:
+    if result.scalar_one_or_none() is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Progetto non trovato"
         )
     
-    await db.delete(project)
+    await db.execute(
+        update(User).where(
+            User.id == current_user.id,
+            User.project_count > 0
+        ).values(project_count=User.project_count - 1)
+    )
     await db.commit()
+    ownership_cache.invalidate_project(project_id)
     
     return {"message": "Progetto eliminato con successo"}
 
@@ -217,25 +192,26 @@ async def get_project_stats(
 ):
     """Get project statistics"""
     
-    stmt = select(Project).where(
+    # Counters and progress are materialized on the project row
+    stmt = select(
+        Project.document_count,
+        Project.analyzed_document_count,
+        Project.progress,
+        Project.last_activity
+    ).where(
         Project.id == project_id,
         Project.owner_id == current_user.id
     )
     result = await db.execute(stmt)
-    project = result.scalar_one_or_none()
+    stats = result.one_or_none()
     
-    if not project:
+    if stats is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Progetto non trovato"
         )
     
-    return {
-        "document_count": project.document_count,
-        "analyzed_document_count": project.analyzed_document_count,
-        "progress": project.calculate_progress(),
-        "last_activity": project.last_activity
-    }
+    return stats._asdict()
 
 
 @router.post("/{project_id}/process-documents")
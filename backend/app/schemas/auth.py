@@ -4,6 +4,15 @@ from datetime import datetime
 from enum import Enum
 
 from app.models.user import UserRole
+from app.services.auth_service import is_strong_password
+
+
+def check_password_strength(password: str) -> str:
+    """Apply the password policy from auth_service, raising on any error"""
+    is_strong, errors = is_strong_password(password)
+    if not is_strong:
+        raise ValueError('; '.join(errors))
+    return password
 
 
 class UserCreate(BaseModel):
@@ -20,13 +29,7 @@ class UserCreate(BaseModel):
     
     @validator('password')
     def validate_password(cls, v):
-        if not any(c.islower() for c in v):
-            raise ValueError('La password deve contenere almeno una lettera minuscola')
-        if not any(c.isupper() for c in v):
-            raise ValueError('La password deve contenere almeno una lettera maiuscola')
-        if not any(c.isdigit() for c in v):
-            raise ValueError('La password deve contenere almeno un numero')
-        return v
+        return check_password_strength(v)
 
 
 class UserLogin(BaseModel):
@@ -78,13 +81,7 @@ class PasswordResetConfirm(BaseModel):
     
     @validator('new_password')
     def validate_password(cls, v):
-        if not any(c.islower() for c in v):
-            raise ValueError('La password deve contenere almeno una lettera minuscola')
-        if not any(c.isupper() for c in v):
-            raise ValueError('La password deve contenere almeno una lettera maiuscola')
-        if not any(c.isdigit() for c in v):
-            raise ValueError('La password deve contenere almeno un numero')
-        return v
+        return check_password_strength(v)
 
 
 class UserUpdate(BaseModel):
@@ -15,6 +15,11 @@ class ChatMessageRequest(BaseModel):
     content: str = Field(..., min_length=1, max_length=2000, description="User message content")
     
 
+class BatchChatRequest(BaseModel):
+    """Request model for answering several independent queries at once"""
+    messages: List[ChatMessageRequest] = Field(..., min_length=1, max_length=100, description="Queries to answer, at most 100")
+
+
 class ChatMessageResponse(BaseModel):
     """Response model for chat messages"""
     id: int
@@ -43,14 +48,27 @@ class ChatHistoryResponse(BaseModel):
     has_more: bool
 
 
+class BatchChatResponse(BaseModel):
+    """Response model for a batch of AI answers, in request order"""
+    messages: List[ChatMessageResponse]
+
+
 class ChatContextChunk(BaseModel):
     """Model for retrieved context chunks"""
+    chunk_id: Optional[str] = None
     document_id: int
     chunk_text: str
     similarity_score: float
     metadata: Dict[str, Any]
 
 
+class ChunkTextResponse(BaseModel):
+    """Response model for the text of a chunk cited by an AI message"""
+    chunk_id: str
+    document_id: int
+    chunk_text: str
+
+
 class ChatStreamResponse(BaseModel):
     """Response model for streaming chat responses"""
     type: str  # "chunk", "done", "error"
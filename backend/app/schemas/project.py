@@ -1,5 +1,5 @@
-from pydantic import BaseModel, ConfigDict
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, TypeAdapter
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -27,4 +27,8 @@ class ProjectResponse(ProjectBase):
     last_activity: datetime
     owner_id: int
     document_count: int
-    analyzed_document_count: int 
\ No newline at end of file
+    analyzed_document_count: int 
+
+
+# Validates a list of projects straight from row objects and dumps it to JSON in one call
+ProjectResponseList = TypeAdapter(List[ProjectResponse])
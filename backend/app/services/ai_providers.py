@@ -3,12 +3,20 @@ AI Providers - Support for multiple AI services including free alternatives
 """
 
 import os
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Union
 from abc import ABC, abstractmethod
 import asyncio
-import httpx
-from anthropic import Anthropic
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import orjson
+from anthropic import AsyncAnthropic
 from app.core.config import settings
+from app.core.http import get_http_client
+
+# Request bodies are serialized with orjson straight to UTF-8 bytes
+JSON_HEADERS = {"Content-Type": "application/json"}
 
 class AIProvider(ABC):
     """Abstract base class for AI providers"""
@@ -20,18 +28,22 @@ class AIProvider(ABC):
     @abstractmethod
     async def generate_embedding(self, text: str) -> List[float]:
         pass
+    
+    async def stream_response(self, prompt: str, context: str = "", **kwargs) -> AsyncIterator[str]:
+        """Yield the response in pieces; providers without streaming yield it whole"""
+        yield await self.generate_response(prompt, context, **kwargs)
 
 class AnthropicProvider(AIProvider):
     """Anthropic Claude provider"""
     
     def __init__(self, api_key: str):
-        self.client = Anthropic(api_key=api_key)
+        self.client = AsyncAnthropic(api_key=api_key)
     
     async def generate_response(self, prompt: str, context: str = "", **kwargs) -> str:
         try:
             full_prompt = f"{context}\n\n{prompt}" if context else prompt
             
-            message = self.client.messages.create(
+            message = await self.client.messages.create(
                 model="deepseek-r1:latest",  # Using deepseek-r1 model
                 max_tokens=1000,
                 messages=[{"role": "user", "content": full_prompt}]
@@ -43,7 +55,7 @@ class AnthropicProvider(AIProvider):
     
     async def generate_embedding(self, text: str) -> List[float]:
         # Anthropic doesn't provide embeddings, fallback to local model
-        return await LocalTransformersProvider().generate_embedding(text)
+        return await (await get_local_fallback()).generate_embedding(text)
 
 class GroqProvider(AIProvider):
     """Groq API provider (Free tier available)"""
@@ -56,33 +68,61 @@ class GroqProvider(AIProvider):
         try:
             full_prompt = f"{context}\n\n{prompt}" if context else prompt
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": "deepseek-r1:latest",  # Using deepseek-r1 model
-                        "messages": [{"role": "user", "content": full_prompt}],
-                        "max_tokens": 1000,
-                        "temperature": 0.7
-                    }
-                )
-                
-                if response.status_code != 200:
-                    raise Exception(f"Groq API error: {response.text}")
-                
-                data = response.json()
-                return data["choices"][0]["message"]["content"]
+            client = await get_http_client()
+            response = await client.post(
+                f"{self.base_url}/chat/completions",
+                headers={"Authorization": f"Bearer {self.api_key}", **JSON_HEADERS},
+                content=orjson.dumps({
+                    "model": "deepseek-r1:latest",  # Using deepseek-r1 model
+                    "messages": [{"role": "user", "content": full_prompt}],
+                    "max_tokens": 1000,
+                    "temperature": 0.7
+                })
+            )
+            
+            if response.status_code != 200:
+                raise Exception(f"Groq API error: {response.text}")
+            
+            data = orjson.loads(response.content)
+            return data["choices"][0]["message"]["content"]
                 
         except Exception as e:
             raise Exception(f"Groq API error: {str(e)}")
     
+    async def stream_response(self, prompt: str, context: str = "", **kwargs) -> AsyncIterator[str]:
+        full_prompt = f"{context}\n\n{prompt}" if context else prompt
+        
+        client = await get_http_client()
+        async with client.stream(
+            "POST",
+            f"{self.base_url}/chat/completions",
+            headers={"Authorization": f"Bearer {self.api_key}", **JSON_HEADERS},
+            content=orjson.dumps({
+                "model": "deepseek-r1:latest",  # Using deepseek-r1 model
+                "messages": [{"role": "user", "content": full_prompt}],
+                "max_tokens": 1000,
+                "temperature": 0.7,
+                "stream": True
+            })
+        ) as response:
+            if response.status_code != 200:
+                await response.aread()
+                raise Exception(f"Groq API error: {response.text}")
+            
+            # OpenAI-compatible server-sent events: "data: {...}" lines, ending with "data: [DONE]"
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                payload = line[len("data: "):]
+                if payload == "[DONE]":
+                    break
+                delta = orjson.loads(payload)["choices"][0].get("delta", {})
+                if delta.get("content"):
+                    yield delta["content"]
+    
     async def generate_embedding(self, text: str) -> List[float]:
         # Groq doesn't provide embeddings, fallback to local model
-        return await LocalTransformersProvider().generate_embedding(text)
+        return await (await get_local_fallback()).generate_embedding(text)
 
 class OllamaProvider(AIProvider):
     """Ollama local provider (Completely free)"""
@@ -94,59 +134,190 @@ class OllamaProvider(AIProvider):
         try:
             full_prompt = f"{context}\n\n{prompt}" if context else prompt
             
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                response = await client.post(
-                    f"{self.host}/api/generate",
-                    json={
-                        "model": kwargs.get("model", settings.OLLAMA_MODEL),  # Use configured model
-                        "prompt": full_prompt,
-                        "stream": False,
-                        "options": {
-                            "temperature": 0.7,
-                            "top_p": 0.9,
-                            "max_tokens": 1000
-                        }
+            client = await get_http_client()
+            response = await client.post(
+                f"{self.host}/api/generate",
+                headers=JSON_HEADERS,
+                content=orjson.dumps({
+                    "model": kwargs.get("model", settings.OLLAMA_MODEL),  # Use configured model
+                    "prompt": full_prompt,
+                    "stream": False,
+                    "options": {
+                        "temperature": 0.7,
+                        "top_p": 0.9,
+                        "max_tokens": 1000
                     }
-                )
-                
-                if response.status_code != 200:
-                    raise Exception(f"Ollama API error: {response.text}")
-                
-                data = response.json()
-                return data["response"]
+                }),
+                timeout=60.0
+            )
+            
+            if response.status_code != 200:
+                raise Exception(f"Ollama API error: {response.text}")
+            
+            data = orjson.loads(response.content)
+            return data["response"]
                 
         except Exception as e:
             raise Exception(f"Ollama API error: {str(e)}")
     
+    async def stream_response(self, prompt: str, context: str = "", **kwargs) -> AsyncIterator[str]:
+        full_prompt = f"{context}\n\n{prompt}" if context else prompt
+        
+        client = await get_http_client()
+        async with client.stream(
+            "POST",
+            f"{self.host}/api/generate",
+            headers=JSON_HEADERS,
+            content=orjson.dumps({
+                "model": kwargs.get("model", settings.OLLAMA_MODEL),  # Use configured model
+                "prompt": full_prompt,
+                "stream": True,
+                "options": {
+                    "temperature": 0.7,
+                    "top_p": 0.9,
+                    "max_tokens": 1000
+                }
+            }),
+            timeout=60.0
+        ) as response:
+            if response.status_code != 200:
+                await response.aread()
+                raise Exception(f"Ollama API error: {response.text}")
+            
+            # Newline-delimited JSON objects, the last one has "done": true
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                data = orjson.loads(line)
+                if data.get("response"):
+                    yield data["response"]
+                if data.get("done"):
+                    break
+    
     async def generate_embedding(self, text: str) -> List[float]:
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    f"{self.host}/api/embeddings",
-                    json={
-                        "model": settings.OLLAMA_EMBEDDING_MODEL,  # Use configured embedding model
-                        "prompt": text
-                    }
-                )
-                
-                if response.status_code != 200:
-                    # Fallback to local transformers
-                    return await LocalTransformersProvider().generate_embedding(text)
-                
-                data = response.json()
-                return data["embedding"]
+            client = await get_http_client()
+            response = await client.post(
+                f"{self.host}/api/embeddings",
+                headers=JSON_HEADERS,
+                content=orjson.dumps({
+                    "model": settings.OLLAMA_EMBEDDING_MODEL,  # Use configured embedding model
+                    "prompt": text
+                }),
+                timeout=30.0
+            )
+            
+            if response.status_code != 200:
+                # Fallback to local transformers
+                return await (await get_local_fallback()).generate_embedding(text)
+            
+            data = orjson.loads(response.content)
+            return data["embedding"]
                 
         except Exception as e:
             # Fallback to local transformers
-            return await LocalTransformersProvider().generate_embedding(text)
+            return await (await get_local_fallback()).generate_embedding(text)
+
+class _MicroBatcher:
+    """
+    Coalesce concurrent single-item calls into batches for a blocking function.
+    
+    Items queued within `window` seconds (up to `max_size`) are handed to
+    `process` together on `executor`, and each caller gets its own result back.
+    """
+    
+    def __init__(
+        self,
+        process: Callable[[List[Any]], List[Any]],
+        executor: ThreadPoolExecutor,
+        max_size: int,
+        window: float
+    ):
+        self._process = process
+        self._executor = executor
+        self._max_size = max_size
+        self._window = window
+        self._pending: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    async def submit(self, item: Any) -> Any:
+        if self._task is None or self._task.done():
+            self._pending = asyncio.Queue()
+            self._task = asyncio.create_task(self._run(self._pending))
+        
+        future = asyncio.get_running_loop().create_future()
+        self._pending.put_nowait((item, future))
+        return await future
+    
+    async def _run(self, pending: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        
+        while True:
+            batch = [await pending.get()]
+            await asyncio.sleep(self._window)
+            while len(batch) < self._max_size and not pending.empty():
+                batch.append(pending.get_nowait())
+            
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, self._process, [item for item, _ in batch]
+                )
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
 
 class LocalTransformersProvider(AIProvider):
     """Local Hugging Face Transformers provider (Completely free)"""
     
+    # Concurrent calls arriving within the window share one generate()/encode() call
+    GENERATION_BATCH_SIZE = 8
+    EMBEDDING_BATCH_SIZE = 32
+    BATCH_WINDOW = 0.02  # seconds
+    
     def __init__(self):
         self._model = None
         self._tokenizer = None
         self._embedding_model = None
+        self._device = "cpu"
+        # One thread per model: batches run back to back instead of contending for the CPU/GPU
+        self._generation_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="local-llm")
+        self._generation_batcher = _MicroBatcher(
+            self._generate_batch,
+            self._generation_executor,
+            self.GENERATION_BATCH_SIZE,
+            self.BATCH_WINDOW
+        )
+        self._embedding_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="local-embed")
+        self._embedding_batcher = _MicroBatcher(
+            self._encode_batch,
+            self._embedding_executor,
+            self.EMBEDDING_BATCH_SIZE,
+            self.BATCH_WINDOW
+        )
+        # Embeddings keyed by a hash of the text; recurring chunks and queries skip the model
+        self._embedding_cache: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+    
+    @staticmethod
+    def _content_key(text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+    
+    def _cached_embedding(self, key: bytes) -> Optional[np.ndarray]:
+        embedding = self._embedding_cache.get(key)
+        if embedding is not None:
+            self._embedding_cache.move_to_end(key)
+        return embedding
+    
+    def _cache_embedding(self, key: bytes, embedding: np.ndarray) -> None:
+        self._embedding_cache[key] = embedding
+        self._embedding_cache.move_to_end(key)
+        while len(self._embedding_cache) > settings.EMBEDDING_CACHE_MAX_ENTRIES:
+            self._embedding_cache.popitem(last=False)
     
     async def _load_model(self):
         """Load model lazily"""
@@ -157,24 +328,76 @@ class LocalTransformersProvider(AIProvider):
                 
                 model_name = "microsoft/DialoGPT-medium"  # Small conversational model
                 
+                self._device = "cuda" if torch.cuda.is_available() else "cpu"
                 self._tokenizer = AutoTokenizer.from_pretrained(model_name)
-                self._model = AutoModelForCausalLM.from_pretrained(model_name)
+                self._model = AutoModelForCausalLM.from_pretrained(model_name).to(self._device)
+                self._model.eval()
                 
-                # Set pad token
+                # Set pad token; decoder-only models must be padded on the left for batched generation
                 if self._tokenizer.pad_token is None:
                     self._tokenizer.pad_token = self._tokenizer.eos_token
+                self._tokenizer.padding_side = "left"
                     
             except ImportError:
                 raise Exception("Transformers library not installed. Run: pip install transformers torch")
     
+    def _generation_kwargs(self) -> Dict[str, Any]:
+        return {
+            "max_new_tokens": 100,
+            "num_return_sequences": 1,
+            "temperature": 0.7,
+            "pad_token_id": self._tokenizer.pad_token_id,
+            "do_sample": True
+        }
+    
+    def _generate_batch(self, prompts: List[str]) -> List[str]:
+        """Run one padded generate() over several prompts (blocking, runs on the inference thread)"""
+        import torch
+        
+        inputs = self._tokenizer(prompts, return_tensors="pt", padding=True).to(self._device)
+        
+        with torch.inference_mode():
+            outputs = self._model.generate(**inputs, **self._generation_kwargs())
+        
+        # Drop the (left-padded) prompt tokens so only the continuation is decoded
+        prompt_length = inputs["input_ids"].shape[1]
+        return [
+            self._tokenizer.decode(output[prompt_length:], skip_special_tokens=True).strip()
+            for output in outputs
+        ]
+    
+    def _generate_streaming(self, prompt: str, streamer) -> None:
+        """Run generate() for one prompt, pushing decoded text into the streamer (blocking)"""
+        import torch
+        
+        inputs = self._tokenizer(prompt, return_tensors="pt").to(self._device)
+        
+        try:
+            with torch.inference_mode():
+                self._model.generate(**inputs, streamer=streamer, **self._generation_kwargs())
+        except Exception:
+            # Unblock the consumer before surfacing the error
+            streamer.end()
+            raise
+    
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        """Encode several texts in one forward pass (blocking, runs on the embedding thread)"""
+        embeddings = self._embedding_model.encode(
+            texts,
+            batch_size=self.EMBEDDING_BATCH_SIZE,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return embeddings.astype(np.float32, copy=False)
+    
     async def _load_embedding_model(self):
         """Load embedding model lazily"""
         if self._embedding_model is None:
             try:
-                from sentence_transformers import SentenceTransformer
+                from app.services.embedding_model import load_embedding_model
                 
                 # Use a multilingual model
-                self._embedding_model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
+                self._embedding_model = load_embedding_model('paraphrase-multilingual-MiniLM-L12-v2')
                 
             except ImportError:
                 raise Exception("Sentence-transformers library not installed. Run: pip install sentence-transformers")
@@ -185,42 +408,80 @@ class LocalTransformersProvider(AIProvider):
             
             full_prompt = f"{context}\n\n{prompt}" if context else prompt
             
-            # Tokenize input
-            inputs = self._tokenizer.encode(full_prompt, return_tensors="pt")
+            # Queue the prompt for the next batch and wait for its continuation
+            response = await self._generation_batcher.submit(full_prompt)
             
-            # Generate response
-            with torch.no_grad():
-                outputs = self._model.generate(
-                    inputs,
-                    max_length=inputs.shape[1] + 100,
-                    num_return_sequences=1,
-                    temperature=0.7,
-                    pad_token_id=self._tokenizer.pad_token_id,
-                    do_sample=True
-                )
+            return response if response else "Mi dispiace, non riesco a generare una risposta appropriata."
             
-            # Decode response
-            response = self._tokenizer.decode(outputs[0], skip_special_tokens=True)
+        except Exception as e:
+            raise Exception(f"Local Transformers error: {str(e)}")
+    
+    async def stream_response(self, prompt: str, context: str = "", **kwargs) -> AsyncIterator[str]:
+        try:
+            await self._load_model()
+            from transformers import TextIteratorStreamer
             
-            # Remove the input prompt from response
-            response = response[len(full_prompt):].strip()
+            full_prompt = f"{context}\n\n{prompt}" if context else prompt
             
-            return response if response else "Mi dispiace, non riesco a generare una risposta appropriata."
+            # Streamed prompts get their own generate() on the inference thread, between batches
+            streamer = TextIteratorStreamer(self._tokenizer, skip_prompt=True, skip_special_tokens=True)
+            loop = asyncio.get_running_loop()
+            generation = loop.run_in_executor(
+                self._generation_executor, self._generate_streaming, full_prompt, streamer
+            )
+            
+            pieces = iter(streamer)
+            while True:
+                piece = await loop.run_in_executor(None, next, pieces, None)
+                if piece is None:
+                    break
+                if piece:
+                    yield piece
+            
+            await generation
             
         except Exception as e:
             raise Exception(f"Local Transformers error: {str(e)}")
     
     async def generate_embedding(self, text: str) -> List[float]:
+        key = self._content_key(text)
+        embedding = self._cached_embedding(key)
+        if embedding is not None:
+            return embedding.tolist()
+        
         try:
             await self._load_embedding_model()
             
-            # Generate embedding
-            embedding = self._embedding_model.encode(text)
-            
-            return embedding.tolist()
+            # Coalesced with concurrent calls into a single encode()
+            embedding = await self._embedding_batcher.submit(text)
             
         except Exception as e:
             raise Exception(f"Local embedding error: {str(e)}")
+        
+        self._cache_embedding(key, embedding)
+        return embedding.tolist()
+    
+    async def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Generate embeddings for several texts, encoding only uncached ones in one encode() call"""
+        keys = [self._content_key(text) for text in texts]
+        embeddings = {key: self._cached_embedding(key) for key in keys}
+        missing = {key: text for key, text in zip(keys, texts) if embeddings[key] is None}
+        
+        if missing:
+            try:
+                await self._load_embedding_model()
+                encoded = await asyncio.get_running_loop().run_in_executor(
+                    self._embedding_executor, self._encode_batch, list(missing.values())
+                )
+                
+            except Exception as e:
+                raise Exception(f"Local embedding error: {str(e)}")
+            
+            for key, embedding in zip(missing, encoded):
+                embeddings[key] = embedding
+                self._cache_embedding(key, embedding)
+        
+        return [embeddings[key].tolist() for key in keys]
 
 class AIProviderFactory:
     """Factory for creating AI providers"""
@@ -232,11 +493,14 @@ class AIProviderFactory:
         if provider_type is None:
             provider_type = settings.AI_PROVIDER
         
-        if provider_type == "anthropic" and settings.ANTHROPIC_API_KEY:
-            return AnthropicProvider(settings.ANTHROPIC_API_KEY)
+        anthropic_api_key = settings.ANTHROPIC_API_KEY.get_secret_value()
+        groq_api_key = settings.GROQ_API_KEY.get_secret_value()
+        
+        if provider_type == "anthropic" and anthropic_api_key:
+            return AnthropicProvider(anthropic_api_key)
         
-        elif provider_type == "groq" and settings.GROQ_API_KEY:
-            return GroqProvider(settings.GROQ_API_KEY)
+        elif provider_type == "groq" and groq_api_key:
+            return GroqProvider(groq_api_key)
         
         elif provider_type == "ollama":
             return OllamaProvider(settings.OLLAMA_HOST)
@@ -246,10 +510,10 @@ class AIProviderFactory:
         
         else:
             # Default fallback order
-            if settings.ANTHROPIC_API_KEY:
-                return AnthropicProvider(settings.ANTHROPIC_API_KEY)
-            elif settings.GROQ_API_KEY:
-                return GroqProvider(settings.GROQ_API_KEY)
+            if anthropic_api_key:
+                return AnthropicProvider(anthropic_api_key)
+            elif groq_api_key:
+                return GroqProvider(groq_api_key)
             else:
                 # Try Ollama first (if available), then local transformers
                 try:
@@ -260,6 +524,13 @@ class AIProviderFactory:
 # Global AI provider instance
 _ai_provider: Optional[AIProvider] = None
 
+# Shared local provider for embedding fallbacks, so its model and cache are loaded once
+_local_fallback: Optional[LocalTransformersProvider] = None
+
+# Admission queue for remote providers: concurrent requests beyond the limit wait their
+# turn instead of piling onto the model server; the local provider batches on its own
+_generation_slots = asyncio.Semaphore(settings.AI_MAX_CONCURRENT_GENERATIONS)
+
 async def get_ai_provider() -> AIProvider:
     """Get the configured AI provider"""
     global _ai_provider
@@ -269,10 +540,39 @@ async def get_ai_provider() -> AIProvider:
     
     return _ai_provider
 
+async def get_local_fallback() -> LocalTransformersProvider:
+    """Get the local provider used when the configured one has no embeddings"""
+    global _local_fallback
+    
+    if _local_fallback is None:
+        _local_fallback = (
+            _ai_provider if isinstance(_ai_provider, LocalTransformersProvider)
+            else LocalTransformersProvider()
+        )
+    
+    return _local_fallback
+
 async def generate_ai_response(prompt: str, context: str = "", **kwargs) -> str:
     """Generate AI response using the configured provider"""
     provider = await get_ai_provider()
-    return await provider.generate_response(prompt, context, **kwargs)
+    if isinstance(provider, LocalTransformersProvider):
+        return await provider.generate_response(prompt, context, **kwargs)
+    
+    async with _generation_slots:
+        return await provider.generate_response(prompt, context, **kwargs)
+
+async def stream_ai_response(prompt: str, context: str = "", **kwargs) -> AsyncIterator[str]:
+    """Stream AI response pieces using the configured provider"""
+    provider = await get_ai_provider()
+    if isinstance(provider, LocalTransformersProvider):
+        async for piece in provider.stream_response(prompt, context, **kwargs):
+            yield piece
+        return
+    
+    # The slot is held until the stream finishes or the consumer stops iterating
+    async with _generation_slots:
+        async for piece in provider.stream_response(prompt, context, **kwargs):
+            yield piece
 
 async def generate_embedding(text: str) -> List[float]:
     """Generate embedding using the configured provider"""
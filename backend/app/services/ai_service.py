@@ -1,43 +1,27 @@
 import logging
 import time
-from typing import List, Dict, Any, Optional, Tuple
+from typing import AsyncIterator, List, Dict, Any, Optional, Sequence, Tuple
 import asyncio
-from datetime import datetime
+from datetime import datetime, timezone
+
+import numpy as np
+import orjson
 
 from app.core.config import settings
 from app.services.vector_service import vector_service
-from app.services.ai_providers import get_ai_provider, generate_ai_response, generate_embedding
+from app.services.ai_providers import get_ai_provider, generate_ai_response, generate_embedding, stream_ai_response
 from app.schemas.chat import ChatContextChunk
 
 logger = logging.getLogger(__name__)
 
+# Upper bound on texts sent to the embedding model in one call
+MAX_EMBED_BATCH = 100
 
-class AIService:
-    def __init__(self):
-        # The AI provider will be determined automatically based on configuration
-        logger.info(f"Initializing AI Service with provider: {settings.AI_PROVIDER}")
-        if settings.AI_PROVIDER == "ollama":
-            logger.info(f"Using Ollama model: {settings.OLLAMA_MODEL} at {settings.OLLAMA_HOST}")
-        
-        self.max_tokens = 4096
-        self.temperature = 0.7
-        
-    def _format_context_chunks(self, chunks: List[ChatContextChunk]) -> str:
-        """Format retrieved chunks into context for DeepSeek R1"""
-        if not chunks:
-            return ""
-            
-        context_parts = []
-        for i, chunk in enumerate(chunks, 1):
-            context_parts.append(f"[Documento {chunk.document_id} - Sezione {i}]")
-            context_parts.append(chunk.chunk_text)
-            context_parts.append("")  # Empty line for separation
-            
-        return "\n".join(context_parts)
-    
-    def _build_system_prompt(self) -> str:
-        """Build system prompt for the AI assistant"""
-        return """Sei un assistente AI specializzato per studenti universitari di facoltà umanistiche, 
+# Characters from the start of a document included in analysis prompts
+ANALYSIS_PREFIX_CHARS = 3000
+
+# System prompt for the AI assistant, fixed for every chat turn
+SYSTEM_PROMPT = """Sei un assistente AI specializzato per studenti universitari di facoltà umanistiche, 
 in particolare Storia e Economia dei Beni Culturali. Il tuo compito è aiutare gli studenti 
 ad analizzare documenti accademici, estrarre concetti chiave e rispondere a domande specifiche.
 
@@ -51,7 +35,140 @@ Caratteristiche del tuo comportamento:
 
 Quando ti vengono forniti documenti come contesto, utilizzali per rispondere alle domande 
 dell'utente in modo accurato e dettagliato."""
+SYSTEM_PROMPT_WITH_SEPARATOR = SYSTEM_PROMPT + "\n\n"
+
+# Analysis prompts as (heading, instructions) pairs around the document excerpt,
+# built once so each call only concatenates the variable parts
+FULL_ANALYSIS_PROMPT = (
+    "Analizza il seguente documento accademico.",
+    """ISTRUZIONI:
+1. Identifica la tesi centrale e riassumila in 2-3 frasi; se non è chiara, spiega l'obiettivo principale
+2. Identifica i 5-8 concetti chiave più importanti, specifici e ordinati per importanza
+3. Analizza la struttura argomentativa: introduzione, argomenti principali, flusso logico, conclusione e strategia
+4. Identifica citazioni e fonti bibliografiche con autore, titolo, anno e tipo (primaria/secondaria)
+
+RISPOSTA solo in formato JSON:
+{
+    "central_thesis": "tesi centrale",
+    "key_concepts": ["concetto 1", "concetto 2", "concetto 3"],
+    "argumentative_structure": {
+        "introduction": "descrizione dell'introduzione",
+        "main_arguments": ["argomento 1", "argomento 2", "argomento 3"],
+        "logical_flow": "descrizione del flusso logico",
+        "conclusion": "descrizione della conclusione",
+        "argumentative_strategy": "strategia argomentativa utilizzata"
+    },
+    "cited_sources": [
+        {
+            "author": "nome autore",
+            "title": "titolo opera",
+            "year": "anno pubblicazione",
+            "type": "primaria/secondaria",
+            "citation_context": "contesto della citazione"
+        }
+    ]
+}"""
+)
+
+CENTRAL_THESIS_PROMPT = (
+    "Analizza il seguente documento accademico e identifica la tesi centrale.",
+    """ISTRUZIONI:
+1. Identifica la tesi centrale o argomentazione principale del documento
+2. Riassumi in 2-3 frasi la tesi centrale
+3. Sii preciso e accademicamente rigoroso
+4. Se il documento non ha una tesi chiara, spiega qual è l'obiettivo principale
+
+RISPOSTA (solo la tesi centrale, senza introduzioni):"""
+)
+
+KEY_CONCEPTS_PROMPT = (
+    "Analizza il seguente documento accademico e identifica i concetti chiave.",
+    """ISTRUZIONI:
+1. Identifica i 5-8 concetti più importanti del documento
+2. Concentrati su concetti specifici e significativi
+3. Evita termini troppo generici o ovvi
+4. Ordina per importanza
+
+RISPOSTA (solo i concetti separati da virgole, senza numerazione):"""
+)
+
+ARGUMENTATIVE_STRUCTURE_PROMPT = (
+    "Analizza la struttura argomentativa del seguente documento accademico.",
+    """ISTRUZIONI:
+1. Identifica l'introduzione, sviluppo e conclusione
+2. Individua i passaggi logici principali dell'argomentazione
+3. Identifica le transizioni e i collegamenti tra le sezioni
+4. Descrivi la strategia argomentativa usata
+
+RISPOSTA in formato JSON:
+{
+    "introduction": "descrizione dell'introduzione",
+    "main_arguments": ["argomento 1", "argomento 2", "argomento 3"],
+    "logical_flow": "descrizione del flusso logico",
+    "conclusion": "descrizione della conclusione",
+    "argumentative_strategy": "strategia argomentativa utilizzata"
+}"""
+)
 
+CITATIONS_PROMPT = (
+    "Identifica tutte le citazioni e fonti bibliografiche nel seguente documento.",
+    """ISTRUZIONI:
+1. Identifica citazioni dirette e indirette
+2. Trova riferimenti bibliografici
+3. Identifica autori, opere e date quando possibile
+4. Distingui tra fonti primarie e secondarie
+
+RISPOSTA in formato JSON array:
+[
+    {
+        "author": "nome autore",
+        "title": "titolo opera",
+        "year": "anno pubblicazione",
+        "type": "primaria/secondaria",
+        "citation_context": "contesto della citazione"
+    }
+]"""
+)
+
+
+def _analysis_prompt(template: Tuple[str, str], filename: str, document_prefix: str) -> str:
+    """Place a document excerpt between an analysis prompt's heading and instructions"""
+    heading, instructions = template
+    return heading + "\n\nDOCUMENTO: " + filename + "\n\nTESTO:\n" + document_prefix + "...\n\n" + instructions
+
+
+def _extract_json(response_text: str, opening: str, closing: str) -> Optional[Any]:
+    """Parse the outermost JSON object or array embedded in a model response, or return None"""
+    # Extract JSON from response (in case there's extra text)
+    json_start = response_text.find(opening)
+    json_end = response_text.rfind(closing) + 1
+    if json_start < 0 or json_end <= json_start:
+        return None
+    
+    try:
+        return orjson.loads(response_text[json_start:json_end])
+    except orjson.JSONDecodeError:
+        return None
+
+
+class AIService:
+    def __init__(self):
+        # The AI provider will be determined automatically based on configuration
+        logger.info(f"Initializing AI Service with provider: {settings.AI_PROVIDER}")
+        if settings.AI_PROVIDER == "ollama":
+            logger.info(f"Using Ollama model: {settings.OLLAMA_MODEL} at {settings.OLLAMA_HOST}")
+        
+        self.max_tokens = 4096
+        self.temperature = 0.7
+        
+    def _format_context_chunks(self, chunks: List[ChatContextChunk]) -> str:
+        """Format retrieved chunks into context for DeepSeek R1"""
+        # One formatted block per chunk, separated by an empty line
+        return "\n\n".join(
+            f"[Documento {chunk.document_id} - Sezione {i}]\n{chunk.chunk_text}"
+            for i, chunk in enumerate(chunks, 1)
+        )
+    
     def _build_user_prompt(self, user_query: str, context_chunks: List[ChatContextChunk]) -> str:
         """Build user prompt with context and query"""
         if not context_chunks:
@@ -71,19 +188,37 @@ Per favore, rispondi alla domanda utilizzando le informazioni del contesto forni
 Se la risposta non è direttamente disponibile nei documenti, indica chiaramente 
 quali parti dei documenti sono più rilevanti e fornisci una risposta ragionata."""
 
+    async def embed_batch(self, texts: List[str]) -> List[np.ndarray]:
+        """Embed several queries (e.g. query + rewrites) with a single model call"""
+        if not texts:
+            return []
+        if len(texts) > MAX_EMBED_BATCH:
+            raise ValueError(f"Cannot embed more than {MAX_EMBED_BATCH} texts per batch")
+        
+        embeddings = await asyncio.to_thread(vector_service.encode_queries, texts)
+        return list(embeddings)
+    
+    async def embed(self, text: str) -> np.ndarray:
+        """Embed a single query with the same model used for document chunks"""
+        embeddings = await self.embed_batch([text])
+        return embeddings[0]
+    
     async def retrieve_context(
         self, 
         project_id: int, 
         query: str, 
-        max_chunks: int = 5
+        max_chunks: int = 5,
+        query_embedding: Optional[Sequence[float]] = None
     ) -> List[ChatContextChunk]:
         """Retrieve relevant context chunks for a query using RAG"""
         try:
-            # Use vector service to search for relevant chunks
-            search_results = vector_service.search_similar_chunks(
+            # Use vector service to search for relevant chunks, off the event loop
+            search_results = await asyncio.to_thread(
+                vector_service.search_similar_chunks,
                 project_id=project_id,
                 query=query,
-                n_results=max_chunks
+                n_results=max_chunks,
+                query_embedding=query_embedding
             )
             
             if not search_results or not search_results.get('documents'):
@@ -95,13 +230,15 @@ quali parti dei documenti sono più rilevanti e fornisci una risposta ragionata.
             documents = search_results['documents'][0]
             metadatas = search_results['metadatas'][0]
             distances = search_results['distances'][0]
+            ids = search_results.get('ids', [[]])[0] or [None] * len(documents)
             
-            for i, (doc_text, metadata, distance) in enumerate(zip(documents, metadatas, distances)):
+            # Convert all distances to similarity scores at once (lower distance = higher similarity)
+            similarity_scores = np.clip(1.0 - np.asarray(distances, dtype=np.float64), 0.0, None).tolist()
+            
+            for chunk_id, doc_text, metadata, similarity_score in zip(ids, documents, metadatas, similarity_scores):
                 if doc_text and metadata:
-                    # Convert distance to similarity score (lower distance = higher similarity)
-                    similarity_score = 1.0 - distance if distance < 1.0 else 0.0
-                    
                     chunk = ChatContextChunk(
+                        chunk_id=chunk_id,
                         document_id=metadata.get('document_id', 0),
                         chunk_text=doc_text,
                         similarity_score=similarity_score,
@@ -116,6 +253,62 @@ quali parti dei documenti sono più rilevanti e fornisci una risposta ragionata.
             logger.error(f"Error retrieving context: {e}")
             return []
     
+    def _build_generation_context(
+        self,
+        context_chunks: List[ChatContextChunk],
+        conversation_history: Optional[List[Dict[str, str]]] = None
+    ) -> str:
+        """Build system instructions + recent conversation + retrieved chunks"""
+        context_text = ""
+        
+        # Add conversation history if provided
+        if conversation_history:
+            for msg in conversation_history[-4:]:  # Last 4 messages for context
+                context_text += f"{msg['role']}: {msg['content']}\n"
+        
+        # Add current context chunks
+        context_text += self._format_context_chunks(context_chunks)
+        
+        return SYSTEM_PROMPT_WITH_SEPARATOR + context_text if context_text else SYSTEM_PROMPT
+    
+    def build_response_metadata(
+        self,
+        response_content: str,
+        context_chunks: List[ChatContextChunk],
+        start_ns: int
+    ) -> Dict[str, Any]:
+        """Build the metadata stored alongside a generated answer"""
+        processing_time = (time.perf_counter_ns() - start_ns) // 1_000_000
+        
+        # Get current model info
+        current_model = settings.OLLAMA_MODEL if settings.AI_PROVIDER == "ollama" else settings.AI_PROVIDER
+        
+        return {
+            "ai_model": current_model,
+            "ai_provider": settings.AI_PROVIDER,
+            "tokens_used": len(response_content) // 4,  # Rough BPE estimate, ~4 characters per token
+            "processing_time_ms": processing_time,
+            "confidence_score": self._calculate_confidence_score(context_chunks),
+            "context_chunks_used": len(context_chunks)
+        }
+    
+    async def stream_response(
+        self,
+        user_query: str,
+        context_chunks: List[ChatContextChunk],
+        conversation_history: Optional[List[Dict[str, str]]] = None
+    ) -> AsyncIterator[str]:
+        """Stream the AI response piece by piece; errors propagate to the caller"""
+        full_context = self._build_generation_context(context_chunks, conversation_history)
+        
+        async for piece in stream_ai_response(
+            prompt=user_query,
+            context=full_context,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens
+        ):
+            yield piece
+    
     async def generate_response(
         self, 
         user_query: str, 
@@ -123,23 +316,10 @@ quali parti dei documenti sono più rilevanti e fornisci una risposta ragionata.
         conversation_history: Optional[List[Dict[str, str]]] = None
     ) -> Tuple[str, Dict[str, Any]]:
         """Generate AI response using configured AI provider with RAG context"""
-        start_time = time.time()
+        start_ns = time.perf_counter_ns()
         
         try:
-            # Build context from conversation history and current query
-            context_text = ""
-            
-            # Add conversation history if provided
-            if conversation_history:
-                for msg in conversation_history[-4:]:  # Last 4 messages for context
-                    context_text += f"{msg['role']}: {msg['content']}\n"
-            
-            # Add current context chunks
-            context_text += self._format_context_chunks(context_chunks)
-            
-            # Build the complete prompt with system instructions + context + query
-            system_prompt = self._build_system_prompt()
-            full_context = f"{system_prompt}\n\n{context_text}" if context_text else system_prompt
+            full_context = self._build_generation_context(context_chunks, conversation_history)
             
             # Use the new AI provider system
             response_content = await generate_ai_response(
@@ -149,30 +329,14 @@ quali parti dei documenti sono più rilevanti e fornisci una risposta ragionata.
                 max_tokens=self.max_tokens
             )
             
-            # Calculate metadata
-            processing_time = int((time.time() - start_time) * 1000)
-            
-            # Calculate confidence score based on context relevance
-            confidence_score = self._calculate_confidence_score(context_chunks)
-            
-            # Get current model info
-            current_model = settings.OLLAMA_MODEL if settings.AI_PROVIDER == "ollama" else settings.AI_PROVIDER
-            
-            metadata = {
-                "ai_model": current_model,
-                "ai_provider": settings.AI_PROVIDER,
-                "tokens_used": len(response_content.split()) * 1.3,  # Rough estimate
-                "processing_time_ms": processing_time,
-                "confidence_score": confidence_score,
-                "context_chunks_used": len(context_chunks)
-            }
+            metadata = self.build_response_metadata(response_content, context_chunks, start_ns)
             
-            logger.info(f"Generated AI response in {processing_time}ms using {current_model}")
+            logger.info(f"Generated AI response in {metadata['processing_time_ms']}ms using {metadata['ai_model']}")
             return response_content, metadata
             
         except Exception as e:
             logger.error(f"Error generating AI response: {e}")
-            processing_time = int((time.time() - start_time) * 1000)
+            processing_time = (time.perf_counter_ns() - start_ns) // 1_000_000
             
             # Return fallback response
             fallback_response = f"Mi dispiace, si è verificato un errore nella generazione della risposta. Errore: {str(e)}"
@@ -194,8 +358,13 @@ quali parti dei documenti sono più rilevanti e fornisci una risposta ragionata.
         if not context_chunks:
             return 0.0
             
-        # Average similarity scores of retrieved chunks
-        avg_similarity = sum(chunk.similarity_score for chunk in context_chunks) / len(context_chunks)
+        # Average similarity scores of retrieved chunks, gathered into one array
+        similarity_scores = np.fromiter(
+            (chunk.similarity_score for chunk in context_chunks),
+            dtype=np.float64,
+            count=len(context_chunks)
+        )
+        avg_similarity = float(similarity_scores.mean())
         
         # Boost confidence if we have multiple relevant chunks
         chunk_count_boost = min(len(context_chunks) / 5.0, 1.0)
@@ -212,8 +381,8 @@ quali parti dei documenti sono più rilevanti e fornisci una risposta ragionata.
     ) -> List[str]:
         """Generate suggested questions based on project content"""
         try:
-            # Get collection stats to understand project content
-            stats = vector_service.get_collection_stats(project_id)
+            # Get collection stats to understand project content, off the event loop
+            stats = await asyncio.to_thread(vector_service.get_collection_stats, project_id)
             
             if stats.get('total_chunks', 0) == 0:
                 return [
@@ -248,22 +417,28 @@ quali parti dei documenti sono più rilevanti e fornisci una risposta ragionata.
         if not document_text or len(document_text.strip()) < 100:
             raise ValueError("Document text is too short for meaningful analysis")
         
-        start_time = time.time()
+        start_ns = time.perf_counter_ns()
+        
+        # Only the start of the document goes into the prompts; slice it once
+        document_prefix = document_text[:ANALYSIS_PREFIX_CHARS]
         
         try:
-            # Run all analyses in parallel for efficiency
-            central_thesis_task = self._extract_central_thesis(document_text, filename)
-            key_concepts_task = self._extract_key_concepts(document_text, filename)
-            structure_task = self._analyze_argumentative_structure(document_text, filename)
-            citations_task = self._extract_citations(document_text, filename)
-            
-            # Wait for all analyses to complete
-            central_thesis = await central_thesis_task
-            key_concepts = await key_concepts_task
-            argumentative_structure = await structure_task
-            cited_sources = await citations_task
-            
-            processing_time = int((time.time() - start_time) * 1000)
+            # One fused prompt prefills the document once instead of four times
+            analysis = await self._full_analysis(document_prefix, filename)
+            
+            if analysis is not None:
+                central_thesis, key_concepts, argumentative_structure, cited_sources = analysis
+            else:
+                # The fused answer was unusable: run the four analyses in parallel;
+                # each one handles its own errors, so a failure does not cancel the others
+                central_thesis, key_concepts, argumentative_structure, cited_sources = await asyncio.gather(
+                    self._extract_central_thesis(document_prefix, filename),
+                    self._extract_key_concepts(document_prefix, filename),
+                    self._analyze_argumentative_structure(document_prefix, filename),
+                    self._extract_citations(document_prefix, filename)
+                )
+            
+            processing_time = (time.perf_counter_ns() - start_ns) // 1_000_000
             
             current_model = settings.OLLAMA_MODEL if settings.AI_PROVIDER == "ollama" else settings.AI_PROVIDER
             
@@ -276,7 +451,7 @@ quali parti dei documenti sono più rilevanti e fornisci una risposta ragionata.
                     "ai_model": current_model,
                     "ai_provider": settings.AI_PROVIDER,
                     "processing_time_ms": processing_time,
-                    "analyzed_at": datetime.now().isoformat(),
+                    "analyzed_at": datetime.now(timezone.utc).isoformat(),
                     "document_length": len(document_text),
                     "filename": filename
                 }
@@ -289,23 +464,50 @@ quali parti dei documenti sono più rilevanti e fornisci una risposta ragionata.
             logger.error(f"Error analyzing document {filename}: {e}")
             raise
 
-    async def _extract_central_thesis(self, document_text: str, filename: str) -> str:
-        """Extract the central thesis from the document"""
+    async def _full_analysis(self, document_prefix: str, filename: str) -> Optional[Tuple[str, List[str], Dict[str, Any], List[Dict[str, Any]]]]:
+        """Extract thesis, key concepts, structure and citations with a single prompt"""
         try:
-            prompt = f"""Analizza il seguente documento accademico e identifica la tesi centrale.
-
-DOCUMENTO: {filename}
+            prompt = _analysis_prompt(FULL_ANALYSIS_PROMPT, filename, document_prefix)
 
-TESTO:
-{document_text[:3000]}...
-
-ISTRUZIONI:
-1. Identifica la tesi centrale o argomentazione principale del documento
-2. Riassumi in 2-3 frasi la tesi centrale
-3. Sii preciso e accademicamente rigoroso
-4. Se il documento non ha una tesi chiara, spiega qual è l'obiettivo principale
+            response = await generate_ai_response(
+                prompt=prompt,
+                context="",
+                temperature=0.3,
+                max_tokens=2500
+            )
+            
+            analysis = _extract_json(response, '{', '}') if response else None
+            if not isinstance(analysis, dict):
+                return None
+            
+            central_thesis = analysis.get("central_thesis")
+            key_concepts = analysis.get("key_concepts")
+            structure = analysis.get("argumentative_structure")
+            citations = analysis.get("cited_sources")
+            if not isinstance(central_thesis, str) or not isinstance(structure, dict):
+                return None
+            
+            if isinstance(key_concepts, str):
+                key_concepts = key_concepts.split(',')
+            if not isinstance(key_concepts, list):
+                key_concepts = []
+            key_concepts = [str(concept).strip() for concept in key_concepts if str(concept).strip()]
+            
+            return (
+                central_thesis.strip() or "Tesi centrale non identificata",
+                key_concepts[:8],  # Limit to max 8 concepts
+                structure,
+                citations[:10] if isinstance(citations, list) else []  # Limit to max 10 citations
+            )
+            
+        except Exception as e:
+            logger.error(f"Error running combined document analysis: {e}")
+            return None
 
-RISPOSTA (solo la tesi centrale, senza introduzioni):"""
+    async def _extract_central_thesis(self, document_prefix: str, filename: str) -> str:
+        """Extract the central thesis from the document"""
+        try:
+            prompt = _analysis_prompt(CENTRAL_THESIS_PROMPT, filename, document_prefix)
 
             response = await generate_ai_response(
                 prompt=prompt,
@@ -320,23 +522,10 @@ RISPOSTA (solo la tesi centrale, senza introduzioni):"""
             logger.error(f"Error extracting central thesis: {e}")
             return "Errore nell'estrazione della tesi centrale"
 
-    async def _extract_key_concepts(self, document_text: str, filename: str) -> List[str]:
+    async def _extract_key_concepts(self, document_prefix: str, filename: str) -> List[str]:
         """Extract key concepts from the document"""
         try:
-            prompt = f"""Analizza il seguente documento accademico e identifica i concetti chiave.
-
-DOCUMENTO: {filename}
-
-TESTO:
-{document_text[:3000]}...
-
-ISTRUZIONI:
-1. Identifica i 5-8 concetti più importanti del documento
-2. Concentrati su concetti specifici e significativi
-3. Evita termini troppo generici o ovvi
-4. Ordina per importanza
-
-RISPOSTA (solo i concetti separati da virgole, senza numerazione):"""
+            prompt = _analysis_prompt(KEY_CONCEPTS_PROMPT, filename, document_prefix)
 
             response = await generate_ai_response(
                 prompt=prompt,
@@ -357,30 +546,10 @@ RISPOSTA (solo i concetti separati da virgole, senza numerazione):"""
             logger.error(f"Error extracting key concepts: {e}")
             return []
 
-    async def _analyze_argumentative_structure(self, document_text: str, filename: str) -> Dict[str, Any]:
+    async def _analyze_argumentative_structure(self, document_prefix: str, filename: str) -> Dict[str, Any]:
         """Analyze the argumentative structure of the document"""
         try:
-            prompt = f"""Analizza la struttura argomentativa del seguente documento accademico.
-
-DOCUMENTO: {filename}
-
-TESTO:
-{document_text[:3000]}...
-
-ISTRUZIONI:
-1. Identifica l'introduzione, sviluppo e conclusione
-2. Individua i passaggi logici principali dell'argomentazione
-3. Identifica le transizioni e i collegamenti tra le sezioni
-4. Descrivi la strategia argomentativa usata
-
-RISPOSTA in formato JSON:
-{{
-    "introduction": "descrizione dell'introduzione",
-    "main_arguments": ["argomento 1", "argomento 2", "argomento 3"],
-    "logical_flow": "descrizione del flusso logico",
-    "conclusion": "descrizione della conclusione",
-    "argumentative_strategy": "strategia argomentativa utilizzata"
-}}"""
+            prompt = _analysis_prompt(ARGUMENTATIVE_STRUCTURE_PROMPT, filename, document_prefix)
 
             response = await generate_ai_response(
                 prompt=prompt,
@@ -390,25 +559,18 @@ RISPOSTA in formato JSON:
             )
             
             if response:
-                response_text = response
-                try:
-                    # Try to parse JSON response
-                    import json
-                    # Extract JSON from response (in case there's extra text)
-                    json_start = response_text.find('{')
-                    json_end = response_text.rfind('}') + 1
-                    if json_start >= 0 and json_end > json_start:
-                        json_str = response_text[json_start:json_end]
-                        return json.loads(json_str)
-                except:
-                    # If JSON parsing fails, return structured text
-                    return {
-                        "introduction": "Struttura non identificata",
-                        "main_arguments": [],
-                        "logical_flow": response_text,
-                        "conclusion": "Conclusione non identificata",
-                        "argumentative_strategy": "Strategia non identificata"
-                    }
+                structure = _extract_json(response, '{', '}')
+                if structure is not None:
+                    return structure
+                
+                # If JSON parsing fails, return structured text
+                return {
+                    "introduction": "Struttura non identificata",
+                    "main_arguments": [],
+                    "logical_flow": response,
+                    "conclusion": "Conclusione non identificata",
+                    "argumentative_strategy": "Strategia non identificata"
+                }
             
             return {
                 "introduction": "Analisi non disponibile",
@@ -428,32 +590,10 @@ RISPOSTA in formato JSON:
                 "argumentative_strategy": "Errore nell'analisi"
             }
 
-    async def _extract_citations(self, document_text: str, filename: str) -> List[Dict[str, Any]]:
+    async def _extract_citations(self, document_prefix: str, filename: str) -> List[Dict[str, Any]]:
         """Extract citations and sources from the document"""
         try:
-            prompt = f"""Identifica tutte le citazioni e fonti bibliografiche nel seguente documento.
-
-DOCUMENTO: {filename}
-
-TESTO:
-{document_text[:3000]}...
-
-ISTRUZIONI:
-1. Identifica citazioni dirette e indirette
-2. Trova riferimenti bibliografici
-3. Identifica autori, opere e date quando possibile
-4. Distingui tra fonti primarie e secondarie
-
-RISPOSTA in formato JSON array:
-[
-    {{
-        "author": "nome autore",
-        "title": "titolo opera",
-        "year": "anno pubblicazione",
-        "type": "primaria/secondaria",
-        "citation_context": "contesto della citazione"
-    }}
-]"""
+            prompt = _analysis_prompt(CITATIONS_PROMPT, filename, document_prefix)
 
             response = await generate_ai_response(
                 prompt=prompt,
@@ -463,20 +603,9 @@ RISPOSTA in formato JSON array:
             )
             
             if response:
-                response_text = response
-                try:
-                    # Try to parse JSON response
-                    import json
-                    # Extract JSON from response
-                    json_start = response_text.find('[')
-                    json_end = response_text.rfind(']') + 1
-                    if json_start >= 0 and json_end > json_start:
-                        json_str = response_text[json_start:json_end]
-                        citations = json.loads(json_str)
-                        return citations[:10]  # Limit to max 10 citations
-                except:
-                    # If JSON parsing fails, return empty list
-                    pass
+                citations = _extract_json(response, '[', ']')
+                if isinstance(citations, list):
+                    return citations[:10]  # Limit to max 10 citations
             
             return []
             
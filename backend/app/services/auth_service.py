@@ -1,36 +1,81 @@
-from passlib.context import CryptContext
-from jose import JWTError, jwt
-from datetime import datetime, timedelta
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+from datetime import datetime, timedelta, timezone
 from typing import Optional, Dict, Any
+import asyncio
 import secrets
+import string
+
+import bcrypt
+import jwt
 
 from app.core.config import settings
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing: argon2id for new hashes, bcrypt kept to verify legacy ones
+password_hasher = PasswordHasher(
+    time_cost=settings.ARGON2_TIME_COST,
+    memory_cost=settings.ARGON2_MEMORY_COST,
+    parallelism=settings.ARGON2_PARALLELISM
+)
+BCRYPT_PREFIXES = ("$2a$", "$2b$", "$2y$")
+
+# Character pools for generated passwords
+PASSWORD_SYMBOLS = "!@#$%^&*"
+PASSWORD_ALPHABET = string.ascii_letters + string.digits + PASSWORD_SYMBOLS
+
+# JWT signing key and algorithm, resolved once from settings
+JWT_SECRET = settings.SECRET_KEY.get_secret_value().encode()
+JWT_ALGORITHMS = [settings.ALGORITHM]
+
+# Token lifetimes, built once from settings
+ACCESS_TOKEN_EXPIRE = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+RESET_TOKEN_EXPIRE = timedelta(hours=1)
 
 
 def get_password_hash(password: str) -> str:
-    """Hash a password using bcrypt"""
-    return pwd_context.hash(password)
+    """Hash a password using argon2id"""
+    return password_hasher.hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    """Verify a password against its argon2id or legacy bcrypt hash"""
+    if hashed_password.startswith(BCRYPT_PREFIXES):
+        try:
+            return bcrypt.checkpw(plain_password.encode(), hashed_password.encode())
+        except ValueError:
+            return False
+    
+    try:
+        return password_hasher.verify(hashed_password, plain_password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Check whether a hash is legacy bcrypt or uses outdated argon2 parameters"""
+    if hashed_password.startswith(BCRYPT_PREFIXES):
+        return True
+    return password_hasher.check_needs_rehash(hashed_password)
+
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password in a worker thread so hashing does not block the event loop"""
+    return await asyncio.to_thread(get_password_hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password in a worker thread so hashing does not block the event loop"""
+    return await asyncio.to_thread(verify_password, plain_password, hashed_password)
 
 
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token"""
     to_encode = data.copy()
     
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    expire = datetime.now(timezone.utc) + (expires_delta or ACCESS_TOKEN_EXPIRE)
     
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, JWT_SECRET, algorithm=settings.ALGORITHM)
     
     return encoded_jwt
 
@@ -38,14 +83,9 @@ def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta]
 def decode_token(token: str) -> Dict[str, Any]:
     """Decode and validate a JWT token"""
     try:
-        payload = jwt.decode(
-            token, 
-            settings.SECRET_KEY, 
-            algorithms=[settings.ALGORITHM]
-        )
-        return payload
-    except JWTError:
-        raise JWTError("Token non valido")
+        return jwt.decode(token, JWT_SECRET, algorithms=JWT_ALGORITHMS)
+    except jwt.PyJWTError:
+        raise jwt.InvalidTokenError("Token non valido")
 
 
 def create_reset_token() -> str:
@@ -55,8 +95,14 @@ def create_reset_token() -> str:
 
 def verify_reset_token(token: str, stored_token: str, created_at: datetime) -> bool:
     """Verify password reset token"""
-    # Token expires after 1 hour
-    if datetime.utcnow() - created_at > timedelta(hours=1):
+    # Token expires after 1 hour; naive timestamps (e.g. from SQLite) are UTC
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    if datetime.now(timezone.utc) - created_at > RESET_TOKEN_EXPIRE:
+        return False
+    
+    # Tokens have a fixed, public length; reject malformed input before the constant-time compare
+    if len(token) != len(stored_token):
         return False
     
     return secrets.compare_digest(token, stored_token)
@@ -72,13 +118,22 @@ def is_strong_password(password: str) -> tuple[bool, list[str]]:
     if len(password) > 100:
         errors.append("La password non può superare i 100 caratteri")
     
-    if not any(c.islower() for c in password):
+    # Single pass over the password, stopping once every character class is seen
+    has_lower = has_upper = has_digit = False
+    for c in password:
+        has_lower = has_lower or c.islower()
+        has_upper = has_upper or c.isupper()
+        has_digit = has_digit or c.isdigit()
+        if has_lower and has_upper and has_digit:
+            break
+    
+    if not has_lower:
         errors.append("La password deve contenere almeno una lettera minuscola")
     
-    if not any(c.isupper() for c in password):
+    if not has_upper:
         errors.append("La password deve contenere almeno una lettera maiuscola")
     
-    if not any(c.isdigit() for c in password):
+    if not has_digit:
         errors.append("La password deve contenere almeno un numero")
     
     return len(errors) == 0, errors
@@ -86,21 +141,20 @@ def is_strong_password(password: str) -> tuple[bool, list[str]]:
 
 def generate_secure_password(length: int = 12) -> str:
     """Generate a secure random password"""
-    import string
-    
     # Ensure we have at least one of each required character type
     password = [
         secrets.choice(string.ascii_lowercase),
         secrets.choice(string.ascii_uppercase),
         secrets.choice(string.digits),
-        secrets.choice("!@#$%^&*")
+        secrets.choice(PASSWORD_SYMBOLS)
     ]
     
     # Fill the rest with random characters
-    all_chars = string.ascii_letters + string.digits + "!@#$%^&*"
-    password.extend(secrets.choice(all_chars) for _ in range(length - 4))
+    password.extend(secrets.choice(PASSWORD_ALPHABET) for _ in range(length - 4))
     
-    # Shuffle the password
-    secrets.SystemRandom().shuffle(password)
+    # Fisher-Yates shuffle drawing each swap index straight from secrets
+    for i in range(len(password) - 1, 0, -1):
+        j = secrets.randbelow(i + 1)
+        password[i], password[j] = password[j], password[i]
     
-    return ''.join(password) 
\ No newline at end of file
+    return ''.join(password)
@@ -1,15 +1,18 @@
 import asyncio
+import itertools
 import logging
-from typing import Optional, Dict, List
-from datetime import datetime
+import time
+from typing import Optional, Dict, Iterator, List, Set, Tuple
+from datetime import datetime, timedelta, timezone
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-import json
+from sqlalchemy import select, update
+from sqlalchemy.orm import undefer
 
-from app.core.database import get_async_session
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
 from app.models.document import Document, DocumentStatus
 from app.models.project import Project
-from app.services.document_processor import document_processor
+from app.services.document_processor import PDF_PLACEHOLDER_TEXT, document_processor, shutdown_pdf_pool
 from app.services.text_chunker import text_chunker, TextChunk
 from app.services.vector_service import vector_service
 from app.services.ai_service import ai_service
@@ -18,6 +21,63 @@ from app.schemas.chat import ChatContextChunk
 logger = logging.getLogger(__name__)
 
 
+def _claim_statement(document_id: int):
+    """
+    UPDATE that moves an uploaded document to PROCESSING and returns its id.
+    
+    The status condition makes the claim atomic across workers and processes: a
+    document already claimed elsewhere matches no row. Only UPLOADED documents are
+    claimed, so a failed document runs again only after reprocess or a project
+    batch resets it.
+    """
+    return (
+        update(Document)
+        .where(Document.id == document_id, Document.status == DocumentStatus.UPLOADED)
+        .values(status=DocumentStatus.PROCESSING)
+        .returning(Document.id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _pending_uploads_statement(in_flight: Set[int], limit: int):
+    """Read-only SELECT of the oldest uploaded documents, skipping this process's own"""
+    return (
+        select(Document.id)
+        .where(Document.status == DocumentStatus.UPLOADED, Document.id.not_in(in_flight))
+        .order_by(Document.id)
+        .limit(limit)
+    )
+
+
+def _release_stale_claims_statement(in_flight: Set[int]):
+    """
+    UPDATE that returns documents stuck in PROCESSING to UPLOADED.
+    
+    A claim is committed before the pipeline runs, so a process that dies mid-run
+    leaves its document in PROCESSING; the claim sets updated_at, and claims older
+    than DOC_PROCESSING_TIMEOUT are released for the poller to pick up again.
+    Documents this process is still working on are left alone.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.DOC_PROCESSING_TIMEOUT)
+    return (
+        update(Document)
+        .where(
+            Document.status == DocumentStatus.PROCESSING,
+            Document.updated_at < cutoff,
+            Document.id.not_in(in_flight)
+        )
+        .values(status=DocumentStatus.UPLOADED)
+        .returning(Document.id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+# Queue priorities: lower values are processed first
+PRIORITY_REPROCESS = 0
+PRIORITY_UPLOAD = 1
+PRIORITY_BATCH = 10
+
+
 class BackgroundProcessor:
     """
     Background service for processing documents:
@@ -29,8 +89,17 @@ class BackgroundProcessor:
     
     def __init__(self):
         self.is_running = False
-        self.processing_queue = asyncio.Queue()
-        self.current_tasks = {}
+        # Entries are (priority, sequence, task); the sequence keeps FIFO order within a priority
+        self.processing_queue = asyncio.PriorityQueue()
+        self._sequence = itertools.count()
+        # Documents claimed by this process; the database status is authoritative
+        self.in_flight: Set[int] = set()
+        self._workers: List[asyncio.Task] = []
+        self._poller: Optional[asyncio.Task] = None
+        # Last vector database heartbeat result with its expiry
+        self._vector_health: Tuple[float, bool] = (0.0, False)
+        # When the next sweep for stale PROCESSING claims is due
+        self._next_stale_sweep = 0.0
         
     async def start(self):
         """Start the background processor"""
@@ -39,135 +108,221 @@ class BackgroundProcessor:
             return
         
         self.is_running = True
-        logger.info("Background processor started")
         
-        # Start processing loop
-        asyncio.create_task(self._processing_loop())
+        # A fixed pool of workers consumes the queue, capping concurrent documents
+        self._workers = [
+            asyncio.create_task(self._worker(worker_id))
+            for worker_id in range(settings.DOC_WORKERS)
+        ]
+        # One poller finds documents uploaded through other processes
+        self._poller = asyncio.create_task(self._poll_uploads())
+        logger.info(f"Background processor started with {settings.DOC_WORKERS} workers")
     
     async def stop(self):
         """Stop the background processor"""
         self.is_running = False
+        
+        tasks = [*self._workers, self._poller] if self._poller else self._workers
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._poller = None
+        shutdown_pdf_pool()
+        
         logger.info("Background processor stopped")
     
-    async def queue_document_for_processing(self, document_id: int, priority: int = 1):
-        """Queue a document for processing"""
+    async def queue_document_for_processing(self, document_id: int, priority: int = PRIORITY_UPLOAD):
+        """Queue a document for processing; lower priority values run first"""
         try:
-            await self.processing_queue.put({
+            await self.processing_queue.put((priority, next(self._sequence), {
                 'document_id': document_id,
                 'priority': priority,
                 'queued_at': datetime.now()
-            })
+            }))
             logger.info(f"Document {document_id} queued for processing")
         except Exception as e:
             logger.error(f"Error queuing document {document_id}: {e}")
     
-    async def _processing_loop(self):
-        """Main processing loop"""
-        while self.is_running:
+    async def _worker(self, worker_id: int):
+        """Process queued documents one at a time"""
+        while True:
+            _, _, task = await self.processing_queue.get()
+            
             try:
-                # Get next document to process
-                task = await asyncio.wait_for(
-                    self.processing_queue.get(),
-                    timeout=5.0  # 5 second timeout
-                )
-                
-                document_id = task['document_id']
-                
-                # Skip if already processing
-                if document_id in self.current_tasks:
-                    logger.info(f"Document {document_id} already being processed")
-                    continue
-                
-                # Start processing
-                self.current_tasks[document_id] = asyncio.create_task(
-                    self._process_document(document_id)
-                )
-                
-            except asyncio.TimeoutError:
-                # No tasks in queue, continue
-                continue
+                await self._process_document(task['document_id'])
             except Exception as e:
-                logger.error(f"Error in processing loop: {e}")
-                await asyncio.sleep(1)
+                logger.error(f"Error in processing worker {worker_id}: {e}")
+            finally:
+                self.processing_queue.task_done()
     
-    async def _process_document(self, document_id: int):
-        """Process a single document through the complete pipeline"""
-        async with get_async_session() as db:
+    async def _poll_uploads(self):
+        """
+        Queue documents uploaded through other processes.
+        
+        Polls only while the queue is empty, with a plain SELECT, so idle polling
+        takes no write lock; workers claim the returned ids as usual. The interval
+        doubles after each empty poll, up to DOC_POLL_MAX_INTERVAL.
+        """
+        interval = settings.DOC_POLL_INTERVAL
+        while True:
+            await asyncio.sleep(interval)
+            if not self.processing_queue.empty():
+                continue
+            
             try:
-                # Get document from database
-                document = await self._get_document(db, document_id)
-                if not document:
-                    logger.error(f"Document {document_id} not found")
-                    return
+                # Release claims left by crashed workers before looking for work
+                await self._release_stale_claims()
                 
-                # Update status to processing
-                document.status = DocumentStatus.PROCESSING
-                await db.commit()
+                async with AsyncSessionLocal() as db:
+                    pending = (await db.scalars(
+                        _pending_uploads_statement(self.in_flight, settings.DOC_WORKERS)
+                    )).all()
                 
-                logger.info(f"Starting processing of document {document_id}: {document.filename}")
-                
-                # Step 1: Extract text
+                for document_id in pending:
+                    await self.queue_document_for_processing(document_id, priority=PRIORITY_BATCH)
+            except Exception as e:
+                logger.error(f"Error polling for uploaded documents: {e}")
+                pending = ()
+            
+            interval = settings.DOC_POLL_INTERVAL if pending else min(interval * 2, settings.DOC_POLL_MAX_INTERVAL)
+    
+    async def _release_stale_claims(self):
+        """Return stale PROCESSING claims to UPLOADED, at most once per DOC_PROCESSING_TIMEOUT"""
+        if time.monotonic() < self._next_stale_sweep:
+            return
+        self._next_stale_sweep = time.monotonic() + settings.DOC_PROCESSING_TIMEOUT
+        
+        async with AsyncSessionLocal() as db:
+            released = (await db.scalars(_release_stale_claims_statement(self.in_flight))).all()
+            await db.commit()
+        
+        if released:
+            logger.warning(f"Released stale processing claims on documents {list(released)}")
+    
+    async def _process_document(self, document_id: int) -> bool:
+        """
+        Claim a document and run it through the complete pipeline.
+        Returns False if the document was not claimed.
+        """
+        async with AsyncSessionLocal() as db:
+            # Claim the document, making the processing status visible
+            claimed_id = await db.scalar(_claim_statement(document_id))
+            await db.commit()
+            
+            if claimed_id is None:
+                logger.info(f"Document {document_id} already claimed or not pending")
+                return False
+            
+            self.in_flight.add(document_id)
+            try:
+                await self._run_pipeline(db, document_id)
+            finally:
+                self.in_flight.discard(document_id)
+            
+            return True
+    
+    async def _run_pipeline(self, db: AsyncSession, document_id: int):
+        """Extract, analyze and index a claimed document"""
+        # Extracted text survives a failure, so a retry does not parse the file again
+        retained = {}
+        try:
+            # Get document from database
+            document = await self._get_document(db, document_id)
+            if not document:
+                raise LookupError(f"Document {document_id} not found")
+            
+            logger.info(f"Starting processing of document {document_id}: {document.filename}")
+            
+            # Step 1: Extract text, unless a reprocess or retry kept it; uploads are
+            # never rewritten, so text stored for the same file is still valid
+            if document.extracted_text is None or document.extracted_text == PDF_PLACEHOLDER_TEXT:
                 extracted_text, page_count = await self._extract_text(document)
                 
-                # Step 2: Update document with extracted text
+                # Step 2: Update document with extracted text; committed with the results below
                 document.extracted_text = extracted_text
                 document.page_count = page_count
-                document.status = DocumentStatus.PROCESSED
-                await db.commit()
-                
-                # Step 3: AI Analysis (NEW)
-                try:
-                    logger.info(f"Starting AI analysis for document {document_id}")
-                    analysis_result = await ai_service.analyze_document(
-                        document_text=extracted_text,
-                        filename=document.original_filename
-                    )
-                    
-                    # Update document with analysis results
-                    document.mark_as_analyzed(analysis_result)
-                    await db.commit()
-                    
-                    logger.info(f"AI analysis completed for document {document_id}")
-                    
-                except Exception as e:
-                    logger.error(f"AI analysis failed for document {document_id}: {e}")
-                    # Continue with processing even if AI analysis fails
-                    
-                # Step 4: Chunk the text
-                chunks = await self._chunk_text(document)
-                
-                # Step 5: Generate embeddings and store in vector DB
-                success = await self._store_embeddings(document, chunks)
-                
-                if success:
-                    # Update document status to final analyzed state
-                    if document.status != DocumentStatus.ANALYZED:
-                        document.status = DocumentStatus.ANALYZED
-                        document.analyzed_at = datetime.now()
-                        await db.commit()
-                    
-                    logger.info(f"Successfully processed document {document_id} with {len(chunks)} chunks")
-                else:
-                    raise Exception("Failed to store embeddings")
-                
-            except Exception as e:
-                logger.error(f"Error processing document {document_id}: {e}")
+                retained = {"extracted_text": extracted_text, "page_count": page_count}
+            else:
+                extracted_text = document.extracted_text
+                logger.info(f"Reusing stored text of document {document_id}")
+            
+            # Steps 3-5: AI analysis runs alongside chunking and embedding, so neither
+            # waits on the other; only this coroutine touches the session
+            analysis_result, indexing_result = await asyncio.gather(
+                self._analyze_text(document_id, extracted_text, document.original_filename),
+                self._index_document(document),
+                return_exceptions=True
+            )
+            
+            if isinstance(analysis_result, dict):
+                # Update document with analysis results
+                document.mark_as_analyzed(analysis_result)
+            
+            if isinstance(indexing_result, BaseException):
+                raise indexing_result
+            
+            success, chunk_count = indexing_result
+            if success:
+                # Update document status to final analyzed state
+                if document.status != DocumentStatus.ANALYZED:
+                    document.status = DocumentStatus.ANALYZED
+                    document.analyzed_at = datetime.now(timezone.utc)
                 
-                # Update document with error
-                document.status = DocumentStatus.ERROR
-                document.error_message = str(e)
+                # One commit for the extracted text, analysis and final status
                 await db.commit()
-                
-            finally:
-                # Remove from current tasks
-                if document_id in self.current_tasks:
-                    del self.current_tasks[document_id]
+                logger.info(f"Successfully processed document {document_id} with {chunk_count} chunks")
+            else:
+                raise Exception("Failed to store embeddings")
+            
+        except Exception as e:
+            logger.error(f"Error processing document {document_id}: {e}")
+            
+            # The session may be unusable after a failed flush or commit: roll back,
+            # then record the error keyed on the id, keeping any extracted text
+            try:
+                await db.rollback()
+                await db.execute(
+                    update(Document)
+                    .where(Document.id == document_id)
+                    .values(status=DocumentStatus.ERROR, error_message=str(e), **retained)
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+            except Exception as status_error:
+                # Left in PROCESSING; the stale claim sweep returns it to UPLOADED
+                logger.error(f"Error recording failure of document {document_id}: {status_error}")
+    
+    async def _analyze_text(self, document_id: int, text: str, filename: str) -> Optional[Dict]:
+        """Run the AI analysis, returning None if it fails"""
+        try:
+            logger.info(f"Starting AI analysis for document {document_id}")
+            analysis_result = await ai_service.analyze_document(
+                document_text=text,
+                filename=filename
+            )
+            logger.info(f"AI analysis completed for document {document_id}")
+            return analysis_result
+            
+        except Exception as e:
+            logger.error(f"AI analysis failed for document {document_id}: {e}")
+            # Continue with processing even if AI analysis fails
+            return None
+    
+    async def _index_document(self, document: Document) -> tuple[bool, int]:
+        """Chunk the extracted text and store its embeddings"""
+        # Step 4: Chunk the text
+        chunks = await self._chunk_text(document)
+        
+        # Step 5: Generate embeddings and store in vector DB
+        success = await self._store_embeddings(document, chunks)
+        return success, len(chunks)
     
     async def _get_document(self, db: AsyncSession, document_id: int) -> Optional[Document]:
         """Get document from database"""
         try:
             result = await db.execute(
-                select(Document).where(Document.id == document_id)
+                select(Document).options(undefer(Document.extracted_text)).where(Document.id == document_id)
             )
             return result.scalar_one_or_none()
         except Exception as e:
@@ -177,10 +332,13 @@ class BackgroundProcessor:
     async def _extract_text(self, document: Document) -> tuple[str, int]:
         """Extract text from document file"""
         try:
+            # PDFs parse in a process pool, DOCX in a thread, keeping the event loop free
             if document.is_pdf:
-                text, page_count = document_processor.extract_text_from_pdf(document.file_path)
+                text, page_count = await document_processor.extract_text_from_pdf_async(document.file_path)
             elif document.is_docx:
-                text, page_count = document_processor.extract_text_from_docx(document.file_path)
+                text, page_count = await asyncio.to_thread(
+                    document_processor.extract_text_from_docx, document.file_path
+                )
             else:
                 raise ValueError(f"Unsupported file type: {document.file_type}")
             
@@ -197,8 +355,9 @@ class BackgroundProcessor:
             if not document.extracted_text:
                 raise ValueError("No extracted text available")
             
-            # Use text chunker to create intelligent chunks
-            chunks = text_chunker.chunk_text(
+            # Use text chunker to create intelligent chunks, off the event loop
+            chunks = await asyncio.to_thread(
+                text_chunker.chunk_text,
                 text=document.extracted_text,
                 document_id=document.id,
                 filename=document.filename
@@ -218,31 +377,13 @@ class BackgroundProcessor:
                 logger.warning(f"No chunks to process for document {document.id}")
                 return False
             
-            # Convert chunks to text and metadata
-            chunk_texts = [chunk.text for chunk in chunks]
-            chunk_metadatas = []
-            
-            for i, chunk in enumerate(chunks):
-                metadata = chunk.metadata.copy()
-                metadata.update({
-                    "chunk_id": i,
-                    "document_id": document.id,
-                    "project_id": document.project_id,
-                    "filename": document.filename,
-                    "file_type": document.file_type,
-                    "chunk_type": chunk.chunk_type.value,
-                    "start_pos": chunk.start_pos,
-                    "end_pos": chunk.end_pos,
-                    "created_at": datetime.now().isoformat()
-                })
-                chunk_metadatas.append(metadata)
-            
-            # Store embeddings in vector database
-            success = vector_service.add_document_embeddings(
+            # Store embeddings in vector database, off the event loop; texts and
+            # metadata are built one batch at a time as the vector service pulls them
+            success = await asyncio.to_thread(
+                vector_service.add_document_embedding_batches,
                 project_id=document.project_id,
                 document_id=document.id,
-                chunks=chunk_texts,
-                metadatas=chunk_metadatas
+                batches=self._iter_chunk_batches(chunks, document.id, settings.VECTOR_UPSERT_BATCH)
             )
             
             if success:
@@ -256,9 +397,34 @@ class BackgroundProcessor:
             logger.error(f"Error storing embeddings for document {document.id}: {e}")
             return False
     
+    @staticmethod
+    def _iter_chunk_batches(
+        chunks: List[TextChunk],
+        document_id: int,
+        batch_size: int
+    ) -> Iterator[Tuple[List[str], List[Dict]]]:
+        """
+        Yield (texts, metadatas) for consecutive batches of chunks.
+        
+        Vectors carry only per-chunk fields plus document_id; filename, file type
+        and timestamps are the same for every chunk and live on the documents row.
+        """
+        for start in range(0, len(chunks), batch_size):
+            batch = chunks[start:start + batch_size]
+            yield [chunk.text for chunk in batch], [
+                {
+                    "document_id": document_id,
+                    "chunk_id": i,
+                    "chunk_type": chunk.chunk_type.value,
+                    "start_pos": chunk.start_pos,
+                    "end_pos": chunk.end_pos
+                }
+                for i, chunk in enumerate(batch, start)
+            ]
+    
     async def reprocess_document(self, document_id: int):
-        """Reprocess a document (delete old embeddings and process again)"""
-        async with get_db() as db:
+        """Reprocess a document (re-index and re-analyze its stored text)"""
+        async with AsyncSessionLocal() as db:
             try:
                 # Get document
                 document = await self._get_document(db, document_id)
@@ -266,22 +432,15 @@ class BackgroundProcessor:
                     logger.error(f"Document {document_id} not found")
                     return
                 
-                # Delete old embeddings
-                vector_service.delete_document_embeddings(
-                    project_id=document.project_id,
-                    document_id=document_id
-                )
-                
-                # Reset document status
+                # Reset document status; the extracted text is kept and reused, and old
+                # embeddings stay until indexing reconciles them chunk by chunk
                 document.status = DocumentStatus.UPLOADED
-                document.extracted_text = None
-                document.page_count = None
                 document.analyzed_at = None
                 document.error_message = None
                 await db.commit()
                 
-                # Queue for processing
-                await self.queue_document_for_processing(document_id)
+                # Queue for processing ahead of uploads and batch work
+                await self.queue_document_for_processing(document_id, priority=PRIORITY_REPROCESS)
                 
                 logger.info(f"Document {document_id} queued for reprocessing")
                 
@@ -293,45 +452,66 @@ class BackgroundProcessor:
         return {
             "is_running": self.is_running,
             "queue_size": self.processing_queue.qsize(),
-            "current_tasks": list(self.current_tasks.keys()),
-            "total_processing": len(self.current_tasks)
+            "current_tasks": list(self.in_flight),
+            "total_processing": len(self.in_flight)
         }
     
     async def process_project_documents(self, project_id: int):
         """Process all documents in a project"""
-        async with get_db() as db:
+        async with AsyncSessionLocal() as db:
             try:
-                # Get all documents for project
+                # Failed documents are retried on this explicit request only:
+                # reset them to UPLOADED so the workers may claim them
+                await db.execute(
+                    update(Document)
+                    .where(Document.project_id == project_id, Document.status == DocumentStatus.ERROR)
+                    .values(status=DocumentStatus.UPLOADED, error_message=None)
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+                
+                # Get all pending documents for project
                 result = await db.execute(
-                    select(Document).where(
+                    select(Document.id).where(
                         Document.project_id == project_id,
-                        Document.status.in_([DocumentStatus.UPLOADED, DocumentStatus.ERROR])
+                        Document.status == DocumentStatus.UPLOADED
                     )
                 )
-                documents = result.scalars().all()
+                document_ids = result.scalars().all()
                 
                 # Queue all documents for processing
-                for document in documents:
-                    await self.queue_document_for_processing(document.id)
+                for document_id in document_ids:
+                    await self.queue_document_for_processing(document_id, priority=PRIORITY_BATCH)
                 
-                logger.info(f"Queued {len(documents)} documents from project {project_id} for processing")
+                logger.info(f"Queued {len(document_ids)} documents from project {project_id} for processing")
                 
             except Exception as e:
                 logger.error(f"Error processing project {project_id} documents: {e}")
     
-    async def health_check(self) -> Dict:
-        """Health check for the background processor"""
+    async def health_check(self, deep: bool = False) -> Dict:
+        """
+        Health check for the background processor.
+        
+        The default check reads in-memory state only, so it is cheap enough for
+        frequent probes; deep=True also pings the vector database, reusing the
+        result for VECTOR_HEALTH_TTL seconds.
+        """
         try:
-            # Check if ChromaDB is accessible
-            vector_stats = vector_service.get_collection_stats(1)  # Test with project 1
-            
-            return {
+            health = {
                 "status": "healthy" if self.is_running else "stopped",
                 "queue_size": self.processing_queue.qsize(),
-                "active_tasks": len(self.current_tasks),
-                "vector_db_accessible": bool(vector_stats),
+                "active_tasks": len(self.in_flight),
                 "timestamp": datetime.now().isoformat()
             }
+            
+            if deep:
+                expires_at, accessible = self._vector_health
+                if expires_at < time.monotonic():
+                    accessible = await asyncio.to_thread(vector_service.heartbeat)
+                    self._vector_health = (time.monotonic() + settings.VECTOR_HEALTH_TTL, accessible)
+                health["vector_db_accessible"] = accessible
+            
+            return health
         except Exception as e:
             logger.error(f"Health check failed: {e}")
             return {
@@ -346,7 +526,7 @@ background_processor = BackgroundProcessor()
 
 
 # Convenience functions for external use
-async def process_document(document_id: int, priority: int = 1):
+async def process_document(document_id: int, priority: int = PRIORITY_UPLOAD):
     """Queue a document for processing"""
     await background_processor.queue_document_for_processing(document_id, priority)
 
@@ -366,6 +546,6 @@ async def get_processing_status():
     return await background_processor.get_processing_status()
 
 
-async def health_check():
+async def health_check(deep: bool = False):
     """Health check for the background processor"""
-    return await background_processor.health_check() 
\ No newline at end of file
+    return await background_processor.health_check(deep) 
\ No newline at end of file
@@ -12,25 +12,44 @@ Usage:
 """
 
 import asyncio
+import atexit
 import logging
+import queue
 import signal
 import sys
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 
+# Optional uvloop import (not available on Windows)
+try:
+    import uvloop
+    HAS_UVLOOP = True
+except ImportError:
+    HAS_UVLOOP = False
+
 # Add parent directory to path
 sys.path.append(str(Path(__file__).parent.parent.parent))
 
 from app.services.background_processor import background_processor
 from app.core.config import settings
 
-# Configure logging
+# Configure logging: records are formatted on the event loop and written to the
+# file and stdout by a listener thread, so disk I/O never blocks the loop.
+# force=True replaces the handler installed when app.core.database was imported
+log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue()
+log_listener = QueueListener(
+    log_queue,
+    logging.FileHandler('background_worker.log'),
+    logging.StreamHandler(sys.stdout)
+)
+log_listener.start()
+atexit.register(log_listener.stop)
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('background_worker.log'),
-        logging.StreamHandler(sys.stdout)
-    ]
+    handlers=[QueueHandler(log_queue)],
+    force=True
 )
 
 logger = logging.getLogger(__name__)
@@ -105,5 +124,6 @@ async def main():
 
 
 if __name__ == "__main__":
-    # Run the background worker
-    asyncio.run(main()) 
\ No newline at end of file
+    # Run the background worker, on the libuv-based uvloop where available
+    with asyncio.Runner(loop_factory=uvloop.new_event_loop if HAS_UVLOOP else None) as runner:
+        runner.run(main())
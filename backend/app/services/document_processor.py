@@ -1,8 +1,12 @@
+import asyncio
+import multiprocessing
 import os
+import re
 import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Optional, Tuple
-import aiofiles
+from typing import BinaryIO, Optional, Tuple
 from fastapi import HTTPException, UploadFile
 from datetime import datetime
 import logging
@@ -11,20 +15,175 @@ import logging
 try:
     import fitz  # PyMuPDF
     HAS_PYMUPDF = True
+    # Recoverable parse warnings are not needed on stderr
+    fitz.TOOLS.mupdf_display_errors(False)
+    PDF_TEXT_FLAGS = fitz.TEXT_PRESERVE_WHITESPACE | fitz.TEXT_MEDIABOX_CLIP
 except ImportError:
     HAS_PYMUPDF = False
     logging.warning("PyMuPDF not available. PDF processing will be limited.")
 
 from app.core.config import settings
 
+MAX_UPLOAD_SIZE = 50 * 1024 * 1024  # 50MB
+SAVE_CHUNK_SIZE = 1024 * 1024  # 1MB per read/write
+
+# Stored as the text of PDFs processed without PyMuPDF
+PDF_PLACEHOLDER_TEXT = (
+    "PDF Text Extraction Not Available\n\n"
+    "PyMuPDF is required for PDF text extraction but is not installed.\n"
+    "Please install PyMuPDF to enable PDF processing:\n"
+    "pip install PyMuPDF\n\n"
+    "Or use DOCX files instead."
+)
+
+# A line break together with the surrounding whitespace and any blank lines
+LINE_BREAK_RE = re.compile(r'\s*\n\s*')
+
+# WordprocessingML names used when streaming word/document.xml
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+W_BODY = f"{W_NS}body"
+W_P = f"{W_NS}p"
+W_R = f"{W_NS}r"
+W_HYPERLINK = f"{W_NS}hyperlink"
+W_T = f"{W_NS}t"
+W_BR = f"{W_NS}br"
+W_TYPE = f"{W_NS}type"
+W_LAST_RENDERED_PAGE_BREAK = f"{W_NS}lastRenderedPageBreak"
+# Text of run children other than <w:t>, as python-docx renders them
+W_RUN_TEXT = {
+    f"{W_NS}tab": "\t",
+    f"{W_NS}ptab": "\t",
+    f"{W_NS}cr": "\n",
+    f"{W_NS}noBreakHyphen": "-",
+}
+
+# Worker processes for PDF parsing, created on first use
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+
+
+def copy_upload(source: BinaryIO, file_path: Path) -> int:
+    """Copy an upload to disk in 1 MB chunks, counting bytes instead of trusting file.size"""
+    file_size = 0
+    with open(file_path, 'wb', buffering=0) as f:
+        while content := source.read(SAVE_CHUNK_SIZE):
+            file_size += len(content)
+            if file_size > MAX_UPLOAD_SIZE:
+                raise HTTPException(
+                    status_code=400,
+                    detail="File troppo grande. Massimo 50MB."
+                )
+            f.write(content)
+    
+    return file_size
+
+
+def clean_text(text: str) -> str:
+    """Clean extracted text: strip every line and drop blank ones, in one regex pass"""
+    return LINE_BREAK_RE.sub('\n', text.strip())
+
+
+def extract_pdf_text(file_path: str) -> Tuple[str, int]:
+    """
+    Extract and clean the text of a PDF with PyMuPDF.
+    Top-level so it can run in a worker process; requires HAS_PYMUPDF.
+    """
+    with fitz.open(file_path, filetype="pdf") as doc:
+        if doc.needs_pass:
+            raise ValueError("PDF protetto da password")
+        
+        page_count = len(doc)
+        # Plain unsorted text with ligatures expanded; blank pages (covers, scans) are skipped
+        page_texts = (page.get_text("text", flags=PDF_TEXT_FLAGS, sort=False) for page in doc)
+        text = "\n\n".join(page_text for page_text in page_texts if page_text and not page_text.isspace())
+    
+    return clean_text(text), page_count
+
+
+def _docx_paragraph_text(paragraph) -> str:
+    """Text of a <w:p> from its runs, including runs inside hyperlinks"""
+    parts = []
+    for child in paragraph:
+        runs = child if child.tag == W_HYPERLINK else (child,)
+        for run in runs:
+            if run.tag != W_R:
+                continue
+            for item in run:
+                if item.tag == W_T:
+                    parts.append(item.text or "")
+                elif item.tag == W_BR:
+                    # Page and column breaks carry no text
+                    if item.get(W_TYPE) in (None, "textWrapping"):
+                        parts.append("\n")
+                else:
+                    parts.append(W_RUN_TEXT.get(item.tag, ""))
+    return "".join(parts)
+
+
+def extract_docx_text(file_path: str) -> Tuple[str, int]:
+    """
+    Extract and clean the text of a DOCX by streaming word/document.xml.
+    
+    Body paragraphs are read as they are parsed and then freed, so memory stays
+    flat on large files. Pages are counted from the page breaks Word recorded at
+    its last layout, or from explicit page breaks when the file was never
+    rendered (e.g. generated documents).
+    """
+    from lxml import etree
+    
+    paragraphs = []
+    rendered_breaks = 0
+    explicit_breaks = 0
+    
+    with zipfile.ZipFile(file_path) as archive, archive.open("word/document.xml") as xml:
+        for _, elem in etree.iterparse(xml, tag=(W_P, W_BR, W_LAST_RENDERED_PAGE_BREAK)):
+            if elem.tag == W_LAST_RENDERED_PAGE_BREAK:
+                rendered_breaks += 1
+            elif elem.tag == W_BR:
+                if elem.get(W_TYPE) == "page":
+                    explicit_breaks += 1
+            elif elem.getparent().tag == W_BODY:
+                paragraph_text = _docx_paragraph_text(elem)
+                if paragraph_text.strip():
+                    paragraphs.append(paragraph_text)
+                
+                # Free this paragraph and everything before it (including tables)
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+    
+    page_count = 1 + (rendered_breaks or explicit_breaks)
+    return clean_text("\n\n".join(paragraphs)), page_count
+
+
+def get_pdf_pool() -> ProcessPoolExecutor:
+    """Get the PDF worker pool; spawned workers avoid forking the event loop and model threads"""
+    global _pdf_pool
+    
+    if _pdf_pool is None:
+        _pdf_pool = ProcessPoolExecutor(
+            max_workers=settings.PDF_WORKERS or os.cpu_count(),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    
+    return _pdf_pool
+
+
+def shutdown_pdf_pool() -> None:
+    """Stop the PDF worker processes, if any were started"""
+    global _pdf_pool
+    
+    if _pdf_pool is not None:
+        _pdf_pool.shutdown(cancel_futures=True)
+        _pdf_pool = None
+
 
 class DocumentProcessor:
     def __init__(self):
         self.upload_dir = Path(settings.UPLOAD_DIR if hasattr(settings, 'UPLOAD_DIR') else "uploads")
         self.upload_dir.mkdir(exist_ok=True)
     
-    async def save_file(self, file: UploadFile, project_id: int) -> Tuple[str, str]:
-        """Save uploaded file to disk and return file path and filename"""
+    async def save_file(self, file: UploadFile, project_id: int) -> Tuple[str, str, int]:
+        """Save uploaded file to disk and return file path, filename and bytes written"""
         
         # Generate unique filename
         file_extension = Path(file.filename).suffix.lower()
@@ -37,17 +196,17 @@ class DocumentProcessor:
         file_path = project_dir / unique_filename
         
         try:
-            # Save file
-            async with aiofiles.open(file_path, 'wb') as f:
-                while content := await file.read(1024):
-                    await f.write(content)
+            # Copy the spooled upload in one worker thread rather than one hop per chunk
+            file_size = await asyncio.to_thread(copy_upload, file.file, file_path)
             
-            return str(file_path), unique_filename
+            return str(file_path), unique_filename, file_size
             
         except Exception as e:
             # Clean up on error
             if file_path.exists():
                 file_path.unlink()
+            if isinstance(e, HTTPException):
+                raise
             raise HTTPException(
                 status_code=500,
                 detail=f"Errore durante il salvataggio del file: {str(e)}"
@@ -70,46 +229,41 @@ class DocumentProcessor:
         if file_extension == '.pdf' and not HAS_PYMUPDF:
             logging.warning(f"PDF file uploaded but PyMuPDF not available: {file.filename}")
         
-        # Check file size (max 50MB)
-        max_size = 50 * 1024 * 1024  # 50MB
-        if file.size > max_size:
+        # Check declared file size (max 50MB); save_file enforces the actual size
+        if file.size is not None and file.size > MAX_UPLOAD_SIZE:
             raise HTTPException(
                 status_code=400,
                 detail="File troppo grande. Massimo 50MB."
             )
     
+    def _pdf_placeholder(self, file_path: str) -> Tuple[str, int]:
+        """Placeholder returned for PDFs when PyMuPDF is not installed"""
+        logging.warning(f"PyMuPDF not available. Cannot extract text from PDF: {file_path}")
+        return PDF_PLACEHOLDER_TEXT, 1
+    
     def extract_text_from_pdf(self, file_path: str) -> Tuple[str, int]:
         """Extract text from PDF file using PyMuPDF"""
         
         if not HAS_PYMUPDF:
-            # Fallback: return placeholder text
-            logging.warning(f"PyMuPDF not available. Cannot extract text from PDF: {file_path}")
-            placeholder_text = (
-                "PDF Text Extraction Not Available\n\n"
-                "PyMuPDF is required for PDF text extraction but is not installed.\n"
-                "Please install PyMuPDF to enable PDF processing:\n"
-                "pip install PyMuPDF\n\n"
-                "Or use DOCX files instead."
+            return self._pdf_placeholder(file_path)
+        
+        try:
+            return extract_pdf_text(file_path)
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Errore nell'estrazione del testo: {str(e)}"
             )
-            return placeholder_text, 1
+    
+    async def extract_text_from_pdf_async(self, file_path: str) -> Tuple[str, int]:
+        """Extract text from PDF file in the worker process pool, off the event loop"""
+        
+        if not HAS_PYMUPDF:
+            return self._pdf_placeholder(file_path)
         
         try:
-            doc = fitz.open(file_path)
-            text = ""
-            page_count = len(doc)
-            
-            for page_num in range(page_count):
-                page = doc[page_num]
-                text += page.get_text()
-                text += "\n\n"  # Add separation between pages
-            
-            doc.close()
-            
-            # Clean up text
-            text = self.clean_text(text)
-            
-            return text, page_count
-            
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(get_pdf_pool(), extract_pdf_text, file_path)
         except Exception as e:
             raise HTTPException(
                 status_code=500,
@@ -117,28 +271,10 @@ class DocumentProcessor:
             )
     
     def extract_text_from_docx(self, file_path: str) -> Tuple[str, int]:
-        """Extract text from DOCX file using python-docx"""
+        """Extract text from DOCX file by streaming its XML with lxml"""
         
         try:
-            import docx
-            
-            doc = docx.Document(file_path)
-            text = ""
-            paragraph_count = 0
-            
-            for paragraph in doc.paragraphs:
-                if paragraph.text.strip():
-                    text += paragraph.text + "\n\n"
-                    paragraph_count += 1
-            
-            # Estimate page count (rough approximation)
-            page_count = max(1, paragraph_count // 10)
-            
-            # Clean up text
-            text = self.clean_text(text)
-            
-            return text, page_count
-            
+            return extract_docx_text(file_path)
         except Exception as e:
             raise HTTPException(
                 status_code=500,
@@ -147,24 +283,7 @@ class DocumentProcessor:
     
     def clean_text(self, text: str) -> str:
         """Clean extracted text"""
-        
-        # Remove excessive whitespace
-        lines = text.split('\n')
-        cleaned_lines = []
-        
-        for line in lines:
-            line = line.strip()
-            if line:
-                cleaned_lines.append(line)
-        
-        # Join lines and normalize spacing
-        cleaned_text = '\n'.join(cleaned_lines)
-        
-        # Remove excessive newlines
-        while '\n\n\n' in cleaned_text:
-            cleaned_text = cleaned_text.replace('\n\n\n', '\n\n')
-        
-        return cleaned_text
+        return clean_text(text)
     
     def get_file_info(self, file_path: str) -> dict:
         """Get file information"""
@@ -0,0 +1,71 @@
+import time
+from collections import OrderedDict
+from typing import Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.project import Project
+
+
+class OwnershipCache:
+    """
+    Short-lived LRU of confirmed (user_id, project_id) ownerships.
+
+    Only positive lookups are cached, so a newly created project is never
+    reported as missing; deleting a project must call invalidate_project().
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl_seconds: int = 30):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[int, int], float]" = OrderedDict()
+
+    def contains(self, user_id: int, project_id: int) -> bool:
+        key = (user_id, project_id)
+        expires_at = self._entries.get(key)
+        if expires_at is None:
+            return False
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return False
+        self._entries.move_to_end(key)
+        return True
+
+    def add(self, user_id: int, project_id: int) -> None:
+        key = (user_id, project_id)
+        self._entries[key] = time.monotonic() + self.ttl_seconds
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate_project(self, project_id: int) -> None:
+        for key in [key for key in self._entries if key[1] == project_id]:
+            del self._entries[key]
+
+
+async def ensure_project_owner(
+    db: AsyncSession,
+    project_id: int,
+    user_id: int,
+    detail: str = "Progetto non trovato"
+) -> None:
+    """Raise 404 unless the user owns the project, skipping the query on a cache hit"""
+    if ownership_cache.contains(user_id, project_id):
+        return
+
+    if not await Project.is_owned_by(db, project_id, user_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=detail
+        )
+
+    ownership_cache.add(user_id, project_id)
+
+
+# Singleton instance
+ownership_cache = OwnershipCache(
+    maxsize=settings.OWNERSHIP_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.OWNERSHIP_CACHE_TTL
+)
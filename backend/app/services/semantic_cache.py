@@ -0,0 +1,185 @@
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedAnswer:
+    """A previously generated answer, reusable for semantically equivalent queries"""
+    query: str
+    response: str
+    context_documents: List[int]
+    retrieved_chunks: List[Dict[str, Any]]
+    confidence_score: Optional[float] = None
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class _ProjectCache:
+    """Bounded LRU of answers for one project, tagged with the project's index version"""
+
+    def __init__(self, version: int):
+        self.version = version
+        self.entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self.embeddings: Dict[int, np.ndarray] = {}
+        self.next_key = 0
+        self._keys: List[int] = []
+        self._matrix: Optional[np.ndarray] = None
+
+    def remove(self, key: int) -> None:
+        del self.entries[key]
+        del self.embeddings[key]
+        self._matrix = None
+
+    def add(self, key: int, answer: CachedAnswer, embedding: np.ndarray) -> None:
+        self.entries[key] = answer
+        self.embeddings[key] = embedding
+        self._matrix = None
+
+    def matrix(self) -> Tuple[List[int], np.ndarray]:
+        """Contiguous float32 matrix of cached embeddings, rebuilt only after a change"""
+        if self._matrix is None:
+            self._keys = list(self.embeddings.keys())
+            self._matrix = np.ascontiguousarray(
+                np.stack([self.embeddings[key] for key in self._keys]), dtype=np.float32
+            )
+        return self._keys, self._matrix
+
+
+class SemanticCache:
+    """
+    In-process semantic cache for chat answers, scoped per project.
+
+    Lookups compare the normalized query embedding against cached ones with a
+    single matrix-vector product; a hit at or above the similarity threshold
+    skips retrieval and generation entirely. Each project carries a version
+    tag that is bumped whenever its documents change, which drops every
+    answer generated against the old content.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.92,
+        max_entries_per_project: int = 256,
+        ttl_seconds: int = 3600
+    ):
+        self.threshold = threshold
+        self.max_entries_per_project = max_entries_per_project
+        self.ttl_seconds = ttl_seconds
+        self._projects: Dict[int, _ProjectCache] = {}
+        self._versions: Dict[int, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        if norm == 0.0:
+            return None
+        return vector / norm
+
+    def _get_project(self, project_id: int) -> _ProjectCache:
+        version = self._versions.get(project_id, 0)
+        project_cache = self._projects.get(project_id)
+        if project_cache is None or project_cache.version != version:
+            project_cache = _ProjectCache(version)
+            self._projects[project_id] = project_cache
+        return project_cache
+
+    def _evict_expired(self, project_cache: _ProjectCache) -> None:
+        cutoff = time.monotonic() - self.ttl_seconds
+        expired = [key for key, entry in project_cache.entries.items() if entry.created_at < cutoff]
+        for key in expired:
+            project_cache.remove(key)
+
+    def version(self, project_id: int) -> int:
+        """Current index version of the project; pass it to put() for answers built from now on"""
+        return self._versions.get(project_id, 0)
+
+    def get(
+        self,
+        project_id: int,
+        query_embedding: Sequence[float],
+        threshold: Optional[float] = None
+    ) -> Optional[CachedAnswer]:
+        """Return the cached answer closest to the query if it clears the threshold"""
+        threshold = self.threshold if threshold is None else threshold
+        project_cache = self._get_project(project_id)
+        self._evict_expired(project_cache)
+
+        query_vector = self._normalize(query_embedding)
+        if query_vector is None or not project_cache.entries:
+            self.misses += 1
+            return None
+
+        keys, matrix = project_cache.matrix()
+        similarities = matrix @ query_vector
+        best = int(np.argmax(similarities))
+
+        if similarities[best] < threshold:
+            self.misses += 1
+            return None
+
+        key = keys[best]
+        project_cache.entries.move_to_end(key)
+        self.hits += 1
+        logger.info(f"Semantic cache hit for project {project_id} (similarity {similarities[best]:.3f})")
+        return project_cache.entries[key]
+
+    def put(
+        self,
+        project_id: int,
+        query_embedding: Sequence[float],
+        answer: CachedAnswer,
+        version: int
+    ) -> None:
+        """
+        Store an answer for the query, evicting the least recently used entry if full.
+        `version` is the project version read before retrieval; if the project was
+        invalidated while the answer was generated, it is built on old content and dropped.
+        """
+        if version != self._versions.get(project_id, 0):
+            return
+
+        query_vector = self._normalize(query_embedding)
+        if query_vector is None:
+            return
+
+        project_cache = self._get_project(project_id)
+        key = project_cache.next_key
+        project_cache.next_key += 1
+        project_cache.add(key, answer, query_vector)
+
+        while len(project_cache.entries) > self.max_entries_per_project:
+            project_cache.remove(next(iter(project_cache.entries)))
+
+    def invalidate_project(self, project_id: int) -> None:
+        """Bump the project's version tag so answers built on old documents are dropped"""
+        self._versions[project_id] = self._versions.get(project_id, 0) + 1
+        self._projects.pop(project_id, None)
+        logger.info(f"Semantic cache invalidated for project {project_id}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache hit/miss counters and size"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "projects": len(self._projects),
+            "entries": sum(len(p.entries) for p in self._projects.values())
+        }
+
+
+# Singleton instance
+semantic_cache = SemanticCache(
+    threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+    max_entries_per_project=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.SEMANTIC_CACHE_TTL
+)
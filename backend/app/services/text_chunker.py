@@ -1,11 +1,20 @@
+import itertools
 import re
 import logging
+from collections import Counter
 from typing import List, Dict, Tuple
 from dataclasses import dataclass
 from enum import Enum
 
+import numpy as np
+
 logger = logging.getLogger(__name__)
 
+# Compiled once at import; the chunker runs these on every paragraph and sentence
+DOTS_RE = re.compile(r'\.{4,}')
+SENTENCE_SPLIT_RE = re.compile(r'[.!?]+\s+')
+SENTENCE_BOUNDARY_RE = re.compile(r'[.!?]\s+')
+
 
 class ChunkType(str, Enum):
     TITLE = "title"
@@ -69,13 +78,25 @@ class TextChunker:
         self.quote_patterns = [
             r'^".*"$',           # Quoted text
             r'^«.*»$',           # French quotes
-            r'^".*"$',           # Smart quotes
+            r'^“.*”$',           # Smart quotes
         ]
         
         self.footnote_patterns = [
             r'^\d+\s+',          # Numbered footnotes
             r'^\*\s+',           # Asterisk footnotes
         ]
+        
+        # One alternation with a named group per type, tried in the order above,
+        # so a single match classifies a paragraph; group names are ChunkType values
+        self.chunk_type_re = re.compile('|'.join(
+            f"(?P<{chunk_type.value}>{'|'.join(patterns)})"
+            for chunk_type, patterns in (
+                (ChunkType.TITLE, self.title_patterns),
+                (ChunkType.LIST_ITEM, self.list_patterns),
+                (ChunkType.QUOTE, self.quote_patterns),
+                (ChunkType.FOOTNOTE, self.footnote_patterns),
+            )
+        ))
     
     def chunk_text(self, text: str, document_id: int, filename: str) -> List[TextChunk]:
         """
@@ -125,56 +146,38 @@ class TextChunker:
             return []
     
     def _preprocess_text(self, text: str) -> str:
-        """Clean and preprocess text"""
-        # Remove excessive whitespace
-        text = re.sub(r'\s+', ' ', text)
-        
-        # Normalize line breaks
-        text = re.sub(r'\n\s*\n', '\n\n', text)
-        
-        # Remove page numbers and headers/footers
-        text = re.sub(r'^\d+\s*$', '', text, flags=re.MULTILINE)
+        """
+        Clean and preprocess text in one pass over its lines: collapse whitespace
+        within each line and drop lines holding only a page number. Line breaks
+        are kept, so blank lines still separate paragraphs.
+        """
+        lines = (' '.join(line.split()) for line in text.split('\n'))
+        text = '\n'.join(line for line in lines if not line.isdecimal())
         
         # Remove excessive punctuation
-        text = re.sub(r'[.]{3,}', '...', text)
+        if '....' in text:
+            text = DOTS_RE.sub('...', text)
         
         return text.strip()
     
     def _split_into_paragraphs(self, text: str) -> List[str]:
-        """Split text into paragraphs"""
-        # Split by double newlines
-        paragraphs = re.split(r'\n\s*\n', text)
-        
-        # Clean each paragraph
-        cleaned_paragraphs = []
-        for para in paragraphs:
-            para = para.strip()
-            if para and len(para) > 20:  # Ignore very short paragraphs
-                cleaned_paragraphs.append(para)
-        
-        return cleaned_paragraphs
+        """
+        Split preprocessed text into paragraphs. Its lines are already stripped,
+        so paragraphs are separated by plain runs of newlines and str.split
+        finds them without the regex engine.
+        """
+        # Split by double newlines; longer runs leave newlines or empty parts
+        # that the strip and the length filter remove
+        return [
+            para for para in (part.strip() for part in text.split('\n\n'))
+            if len(para) > 20  # Ignore very short paragraphs
+        ]
     
     def _detect_chunk_type(self, text: str) -> ChunkType:
         """Detect the type of text chunk"""
-        # Check for titles
-        for pattern in self.title_patterns:
-            if re.match(pattern, text.strip()):
-                return ChunkType.TITLE
-        
-        # Check for lists
-        for pattern in self.list_patterns:
-            if re.match(pattern, text.strip()):
-                return ChunkType.LIST_ITEM
-        
-        # Check for quotes
-        for pattern in self.quote_patterns:
-            if re.match(pattern, text.strip()):
-                return ChunkType.QUOTE
-        
-        # Check for footnotes
-        for pattern in self.footnote_patterns:
-            if re.match(pattern, text.strip()):
-                return ChunkType.FOOTNOTE
+        match = self.chunk_type_re.match(text.strip())
+        if match:
+            return ChunkType(match.lastgroup)
         
         return ChunkType.PARAGRAPH
     
@@ -205,21 +208,25 @@ class TextChunker:
             chunks.append(chunk)
             return chunks
         
-        # Split long paragraphs into multiple chunks
-        sentences = self._split_into_sentences(paragraph)
-        
-        current_chunk = ""
-        current_start = start_pos
+        # Split long paragraphs at sentence boundaries, tracking offsets into the
+        # paragraph and slicing each chunk out once instead of growing a string
+        chunk_start = 0
+        chunk_end = 0
+        sentence_ends = itertools.chain(
+            (boundary.end() for boundary in SENTENCE_SPLIT_RE.finditer(paragraph)),
+            (len(paragraph),)
+        )
         
-        for sentence in sentences:
+        for sentence_end in sentence_ends:
             # Check if adding this sentence would exceed chunk size
-            if len(current_chunk) + len(sentence) > self.chunk_size and current_chunk:
+            if sentence_end - chunk_start > self.chunk_size and chunk_end > chunk_start:
                 # Create chunk with current content
+                chunk_text = paragraph[chunk_start:chunk_end].rstrip()
                 chunk = TextChunk(
-                    text=current_chunk.strip(),
+                    text=chunk_text,
                     chunk_type=chunk_type,
-                    start_pos=current_start,
-                    end_pos=current_start + len(current_chunk),
+                    start_pos=start_pos + chunk_start,
+                    end_pos=start_pos + chunk_start + len(chunk_text),
                     metadata={
                         "document_id": document_id,
                         "filename": filename,
@@ -229,18 +236,18 @@ class TextChunker:
                 chunks.append(chunk)
                 
                 # Start new chunk
-                current_chunk = sentence
-                current_start = current_start + len(chunks[-1].text)
-            else:
-                current_chunk += " " + sentence if current_chunk else sentence
+                chunk_start = chunk_end
+            
+            chunk_end = sentence_end
         
         # Add remaining text as final chunk
-        if current_chunk and len(current_chunk.strip()) >= self.min_chunk_size:
+        chunk_text = paragraph[chunk_start:chunk_end].rstrip()
+        if len(chunk_text) >= self.min_chunk_size:
             chunk = TextChunk(
-                text=current_chunk.strip(),
+                text=chunk_text,
                 chunk_type=chunk_type,
-                start_pos=current_start,
-                end_pos=current_start + len(current_chunk),
+                start_pos=start_pos + chunk_start,
+                end_pos=start_pos + chunk_start + len(chunk_text),
                 metadata={
                     "document_id": document_id,
                     "filename": filename,
@@ -251,50 +258,22 @@ class TextChunker:
         
         return chunks
     
-    def _split_into_sentences(self, text: str) -> List[str]:
-        """Split text into sentences"""
-        # Use regex to split on sentence boundaries
-        sentences = re.split(r'[.!?]+\s+', text)
-        
-        # Clean and filter sentences
-        cleaned_sentences = []
-        for sentence in sentences:
-            sentence = sentence.strip()
-            if sentence and len(sentence) > 10:  # Ignore very short sentences
-                cleaned_sentences.append(sentence)
-        
-        return cleaned_sentences
-    
     def _apply_overlap(self, chunks: List[TextChunk]) -> List[TextChunk]:
-        """Apply overlap between consecutive chunks"""
-        if len(chunks) <= 1:
-            return chunks
-        
-        overlapped_chunks = []
-        
-        for i, chunk in enumerate(chunks):
-            if i == 0:
-                # First chunk - no overlap needed
-                overlapped_chunks.append(chunk)
-            else:
-                # Add overlap from previous chunk
-                prev_chunk = chunks[i-1]
-                overlap_text = self._get_overlap_text(prev_chunk.text, self.overlap_size)
-                
-                if overlap_text:
-                    new_text = overlap_text + " " + chunk.text
-                    new_chunk = TextChunk(
-                        text=new_text,
-                        chunk_type=chunk.chunk_type,
-                        start_pos=chunk.start_pos,
-                        end_pos=chunk.end_pos,
-                        metadata=chunk.metadata.copy()
-                    )
-                    overlapped_chunks.append(new_chunk)
-                else:
-                    overlapped_chunks.append(chunk)
+        """Apply overlap between consecutive chunks, updating them in place"""
+        # Walk backwards so each previous chunk still holds its own text
+        for i in range(len(chunks) - 1, 0, -1):
+            overlap_text = self._get_overlap_text(chunks[i - 1].text, self.overlap_size)
+            
+            if overlap_text:
+                chunk = chunks[i]
+                chunk.text = f"{overlap_text} {chunk.text}"
+                # Joined by a space, so only the short overlap needs counting
+                chunk.metadata.update({
+                    "word_count": len(overlap_text.split()) + chunk.metadata["word_count"],
+                    "char_count": len(chunk.text)
+                })
         
-        return overlapped_chunks
+        return chunks
     
     def _get_overlap_text(self, text: str, overlap_size: int) -> str:
         """Get overlap text from the end of a chunk"""
@@ -305,7 +284,7 @@ class TextChunker:
         overlap_text = text[-overlap_size:]
         
         # Find the first sentence boundary
-        sentence_start = re.search(r'[.!?]\s+', overlap_text)
+        sentence_start = SENTENCE_BOUNDARY_RE.search(overlap_text)
         if sentence_start:
             return overlap_text[sentence_start.end():]
         
@@ -321,15 +300,17 @@ class TextChunker:
                 continue
             
             # Truncate chunks that are too long
-            if len(chunk.text) > self.max_chunk_size:
+            truncated = len(chunk.text) > self.max_chunk_size
+            if truncated:
                 chunk.text = chunk.text[:self.max_chunk_size]
             
             # Clean up text
             chunk.text = chunk.text.strip()
             
-            # Update metadata
+            # Update metadata; stripping never changes the word count, so it is
+            # only recounted when truncation may have cut words off
             chunk.metadata.update({
-                "final_word_count": len(chunk.text.split()),
+                "final_word_count": len(chunk.text.split()) if truncated else chunk.metadata["word_count"],
                 "final_char_count": len(chunk.text)
             })
             
@@ -342,21 +323,21 @@ class TextChunker:
         if not chunks:
             return {}
         
-        word_counts = [chunk.metadata.get("word_count", 0) for chunk in chunks]
-        char_counts = [chunk.metadata.get("char_count", 0) for chunk in chunks]
-        
-        chunk_types = {}
-        for chunk in chunks:
-            chunk_type = chunk.chunk_type.value
-            chunk_types[chunk_type] = chunk_types.get(chunk_type, 0) + 1
+        # One contiguous buffer per statistic, reduced in C
+        word_counts = np.fromiter(
+            (chunk.metadata.get("word_count", 0) for chunk in chunks), dtype=np.int64, count=len(chunks)
+        )
+        char_counts = np.fromiter(
+            (chunk.metadata.get("char_count", 0) for chunk in chunks), dtype=np.int64, count=len(chunks)
+        )
         
         return {
             "total_chunks": len(chunks),
-            "avg_word_count": sum(word_counts) / len(word_counts) if word_counts else 0,
-            "avg_char_count": sum(char_counts) / len(char_counts) if char_counts else 0,
-            "min_word_count": min(word_counts) if word_counts else 0,
-            "max_word_count": max(word_counts) if word_counts else 0,
-            "chunk_types": chunk_types
+            "avg_word_count": float(word_counts.mean()),
+            "avg_char_count": float(char_counts.mean()),
+            "min_word_count": int(word_counts.min()),
+            "max_word_count": int(word_counts.max()),
+            "chunk_types": dict(Counter(chunk.chunk_type.value for chunk in chunks))
         }
 
 
@@ -0,0 +1,77 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from app.core.config import settings
+from app.models.user import User
+
+# Columns captured in a snapshot; attribute names match column names on User
+_USER_COLUMNS = tuple(User.__table__.columns.keys())
+
+
+class UserCache:
+    """
+    Short-lived LRU of active user rows keyed by user id.
+
+    A hit rebuilds a persistent User in the request's session without a SELECT.
+    Its usage counters may be up to the TTL old, so endpoints that check or
+    change quotas load the user through get_current_user_fresh and update the
+    counters with single UPDATE statements. Any flush that modifies a user
+    drops its entry; writes from other workers become visible once the TTL
+    expires.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl_seconds: int = 30):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[int, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    def get(self, db: AsyncSession, user_id: int) -> Optional[User]:
+        """Attach a cached user to the session, or return None on a miss"""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+
+        expires_at, snapshot = entry
+        if expires_at < time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+
+        # The session may already hold this user (e.g. loaded earlier in the request)
+        user = db.sync_session.identity_map.get(inspect(User).identity_key_from_primary_key((user_id,)))
+        if user is not None:
+            return user
+
+        user = User(**snapshot)
+        make_transient_to_detached(user)
+        db.add(user)
+        return user
+
+    def add(self, user: User) -> None:
+        snapshot = {key: getattr(user, key) for key in _USER_COLUMNS}
+        self._entries[user.id] = (time.monotonic() + self.ttl_seconds, snapshot)
+        self._entries.move_to_end(user.id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        self._entries.pop(user_id, None)
+
+
+# Singleton instance
+user_cache = UserCache(
+    maxsize=settings.USER_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.USER_CACHE_TTL
+)
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_flushed_users(session, flush_context):
+    for instance in list(session.dirty) + list(session.deleted):
+        if isinstance(instance, User):
+            user_cache.invalidate(instance.id)
@@ -1,24 +1,68 @@
+import hashlib
 import os
 import logging
-from typing import List, Dict, Optional, Tuple
+import threading
+import time
+from concurrent.futures import Future
+from typing import Iterable, List, Dict, Optional, Sequence, Tuple
 from pathlib import Path
 import chromadb
 from chromadb.config import Settings as ChromaSettings
-from sentence_transformers import SentenceTransformer
 import numpy as np
 from uuid import uuid4
 
 from app.core.config import settings
+from app.services.embedding_model import load_embedding_model
+from app.services.semantic_cache import semantic_cache
 
 logger = logging.getLogger(__name__)
 
 
+def chunk_vector_id(document_id: int, text: str) -> str:
+    """Content-derived vector id: the same text in the same document always gets the same id"""
+    return f"doc_{document_id}_{hashlib.blake2b(text.encode(), digest_size=16).hexdigest()}"
+
+
 class VectorService:
+    """
+    Vector store and embedding model for document chunks.
+    
+    The Chroma client and the model are created on first use, not at import:
+    spawned PDF worker processes re-import the launching script, and must not
+    each load a model copy and open the vector database.
+    """
+    
     def __init__(self):
-        self.client = None
-        self.embedding_model = None
-        self._init_client()
-        self._init_embedding_model()
+        self._client = None
+        self._embedding_model = None
+        self._init_lock = threading.Lock()
+        # Collection handles per project, so queries skip the catalog lookup
+        self._collections: Dict[int, chromadb.Collection] = {}
+        # Chunk counts per project with their expiry, dropped whenever the collection changes
+        self._chunk_counts: Dict[int, Tuple[float, int]] = {}
+        # Document encode requests waiting for the next model call, and whether
+        # a thread is currently running encodes for everyone
+        self._encode_lock = threading.Lock()
+        self._pending_encodes: List[Tuple[List[str], Future]] = []
+        self._encoding = False
+    
+    @property
+    def client(self):
+        """ChromaDB client, opened on first use"""
+        if self._client is None:
+            with self._init_lock:
+                if self._client is None:
+                    self._init_client()
+        return self._client
+    
+    @property
+    def embedding_model(self):
+        """Sentence transformer model, loaded on first use"""
+        if self._embedding_model is None:
+            with self._init_lock:
+                if self._embedding_model is None:
+                    self._init_embedding_model()
+        return self._embedding_model
     
     def _init_client(self):
         """Initialize ChromaDB client"""
@@ -28,7 +72,7 @@ class VectorService:
             vector_db_path.mkdir(parents=True, exist_ok=True)
             
             # Initialize ChromaDB client
-            self.client = chromadb.PersistentClient(
+            self._client = chromadb.PersistentClient(
                 path=str(vector_db_path),
                 settings=ChromaSettings(
                     anonymized_telemetry=False,
@@ -47,29 +91,41 @@ class VectorService:
         try:
             # Use a multilingual model that works well with Italian text
             model_name = "paraphrase-multilingual-MiniLM-L12-v2"
-            self.embedding_model = SentenceTransformer(model_name)
+            self._embedding_model = load_embedding_model(model_name)
             logger.info(f"Embedding model loaded: {model_name}")
             
         except Exception as e:
             logger.error(f"Error loading embedding model: {e}")
             raise
     
+    def _invalidate_project(self, project_id: int) -> None:
+        """Drop cached state derived from a project's collection after it changes"""
+        self._chunk_counts.pop(project_id, None)
+        semantic_cache.invalidate_project(project_id)
+    
+    def heartbeat(self) -> bool:
+        """Check that the vector database answers, without opening any collection"""
+        try:
+            self.client.heartbeat()
+            return True
+        except Exception as e:
+            logger.error(f"Vector database heartbeat failed: {e}")
+            return False
+    
     def get_or_create_collection(self, project_id: int) -> chromadb.Collection:
-        """Get or create collection for a project"""
+        """Get or create collection for a project, reusing the cached handle"""
+        collection = self._collections.get(project_id)
+        if collection is not None:
+            return collection
+        
         try:
             collection_name = f"project_{project_id}"
-            
-            # Try to get existing collection
-            try:
-                collection = self.client.get_collection(name=collection_name)
-                logger.info(f"Retrieved existing collection: {collection_name}")
-            except:
-                # Create new collection if it doesn't exist
-                collection = self.client.create_collection(
-                    name=collection_name,
-                    metadata={"hnsw:space": "cosine"}
-                )
-                logger.info(f"Created new collection: {collection_name}")
+            collection = self.client.get_or_create_collection(
+                name=collection_name,
+                metadata={"hnsw:space": "cosine"}
+            )
+            self._collections[project_id] = collection
+            logger.info(f"Opened collection: {collection_name}")
             
             return collection
             
@@ -78,21 +134,30 @@ class VectorService:
             raise
     
     def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for list of texts"""
+        """
+        Generate embeddings for list of texts.
+        
+        Calls from concurrent document workers are coalesced: the first caller
+        encodes its texts together with everything queued meanwhile in one
+        model call, so small documents share batches and document encodes never
+        overlap each other. Query embeddings (encode_queries) bypass this queue,
+        so a short query never waits behind a document batch, and may run on the
+        model concurrently with it.
+        """
         try:
             if not texts:
                 return []
             
-            # Generate embeddings
-            embeddings = self.embedding_model.encode(
-                texts,
-                batch_size=32,
-                show_progress_bar=True,
-                convert_to_numpy=True
-            )
+            future: Future = Future()
+            with self._encode_lock:
+                self._pending_encodes.append((texts, future))
+                lead = not self._encoding
+                self._encoding = True
+            
+            if lead:
+                self._run_pending_encodes()
             
-            # Convert to list of lists
-            embeddings_list = embeddings.tolist()
+            embeddings_list = future.result()
             
             logger.info(f"Generated embeddings for {len(texts)} text chunks")
             return embeddings_list
@@ -101,6 +166,55 @@ class VectorService:
             logger.error(f"Error generating embeddings: {e}")
             raise
     
+    def _run_pending_encodes(self) -> None:
+        """Encode all pending requests in one model call, until none are left"""
+        while True:
+            with self._encode_lock:
+                requests = self._pending_encodes
+                if not requests:
+                    self._encoding = False
+                    return
+                self._pending_encodes = []
+            
+            try:
+                embeddings = self.embedding_model.encode(
+                    [text for texts, _ in requests for text in texts],
+                    batch_size=settings.EMBED_BATCH_SIZE,
+                    show_progress_bar=False,
+                    convert_to_numpy=True
+                )
+                
+                # Hand each caller its own rows, as a list of lists
+                offset = 0
+                for texts, future in requests:
+                    future.set_result(embeddings[offset:offset + len(texts)].tolist())
+                    offset += len(texts)
+            except Exception as e:
+                for _, future in requests:
+                    if not future.done():
+                        future.set_exception(e)
+    
+    def warm_up(self) -> None:
+        """Run a small encode so the first real query skips one-time setup (tokenizer, kernels)"""
+        try:
+            self.encode_queries(["warmup"] * 8)
+            logger.info("Embedding model warmed up")
+        except Exception as e:
+            logger.warning(f"Embedding model warm-up failed: {e}")
+    
+    def encode_queries(self, texts: List[str]) -> np.ndarray:
+        """Embed short query texts in one forward pass, as a float32 matrix"""
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        
+        embeddings = self.embedding_model.encode(
+            texts,
+            batch_size=len(texts),
+            show_progress_bar=False,
+            convert_to_numpy=True
+        )
+        return embeddings.astype(np.float32, copy=False)
+    
     def add_document_embeddings(
         self, 
         project_id: int, 
@@ -109,28 +223,92 @@ class VectorService:
         metadatas: List[Dict]
     ) -> bool:
         """Add document embeddings to collection"""
+        if not chunks or not metadatas:
+            logger.warning("No chunks or metadatas provided")
+            return False
+        
+        batch_size = settings.VECTOR_UPSERT_BATCH
+        return self.add_document_embedding_batches(
+            project_id,
+            document_id,
+            (
+                (chunks[start:start + batch_size], metadatas[start:start + batch_size])
+                for start in range(0, len(chunks), batch_size)
+            )
+        )
+    
+    def add_document_embedding_batches(
+        self,
+        project_id: int,
+        document_id: int,
+        batches: Iterable[Tuple[List[str], List[Dict]]]
+    ) -> bool:
+        """
+        Add document embeddings from (chunks, metadatas) batches.
+        
+        Each batch is embedded and written before the next one is pulled, so only
+        a batch of texts, metadata and vectors is held in memory, and each add
+        stays under Chroma's maximum batch size.
+        
+        Vector ids derive from the chunk text, so when a document is indexed
+        again only chunks that are not stored yet are embedded; stored chunks get
+        their metadata refreshed and chunks that no longer exist are removed.
+        """
         try:
-            if not chunks or not metadatas:
-                logger.warning("No chunks or metadatas provided")
-                return False
-            
             collection = self.get_or_create_collection(project_id)
             
-            # Generate embeddings
-            embeddings = self.generate_embeddings(chunks)
+            # Vectors already stored for the document, e.g. before a reprocess
+            stale_ids = set(collection.get(where={"document_id": document_id}, include=[])["ids"])
+            kept_ids = set()
+            embedded_count = 0
+            try:
+                for batch_chunks, batch_metadatas in batches:
+                    new_chunks, new_metadatas, new_ids = [], [], []
+                    stored_metadatas, stored_ids = [], []
+                    for chunk, metadata in zip(batch_chunks, batch_metadatas):
+                        vector_id = chunk_vector_id(document_id, chunk)
+                        if vector_id in kept_ids:
+                            # Repeated text within the document is stored once
+                            continue
+                        kept_ids.add(vector_id)
+                        
+                        if vector_id in stale_ids:
+                            stored_metadatas.append(metadata)
+                            stored_ids.append(vector_id)
+                        else:
+                            new_chunks.append(chunk)
+                            new_metadatas.append(metadata)
+                            new_ids.append(vector_id)
+                    
+                    if stored_ids:
+                        # Unchanged chunks keep their embedding; only positions may move
+                        collection.update(ids=stored_ids, metadatas=stored_metadatas)
+                    if new_ids:
+                        collection.add(
+                            embeddings=self.generate_embeddings(new_chunks),
+                            documents=new_chunks,
+                            metadatas=new_metadatas,
+                            ids=new_ids
+                        )
+                        embedded_count += len(new_ids)
+                
+                stale_ids -= kept_ids
+                if stale_ids:
+                    collection.delete(ids=list(stale_ids))
+            except Exception:
+                # Drop the document's vectors so it is not half-indexed
+                collection.delete(where={"document_id": document_id})
+                raise
             
-            # Generate unique IDs for each chunk
-            chunk_ids = [f"doc_{document_id}_chunk_{i}" for i in range(len(chunks))]
+            if not kept_ids:
+                logger.warning("No chunks or metadatas provided")
+                return False
             
-            # Add to collection
-            collection.add(
-                embeddings=embeddings,
-                documents=chunks,
-                metadatas=metadatas,
-                ids=chunk_ids
+            logger.info(
+                f"Indexed {len(kept_ids)} chunks ({embedded_count} embedded, {len(stale_ids)} removed) "
+                f"for document {document_id} in collection project_{project_id}"
             )
-            
-            logger.info(f"Added {len(chunks)} chunks for document {document_id} to collection project_{project_id}")
+            self._invalidate_project(project_id)
             return True
             
         except Exception as e:
@@ -142,14 +320,18 @@ class VectorService:
         project_id: int, 
         query: str, 
         n_results: int = 10,
-        where: Optional[Dict] = None
+        where: Optional[Dict] = None,
+        query_embedding: Optional[Sequence[float]] = None
     ) -> Dict:
         """Search for similar chunks in project collection"""
         try:
             collection = self.get_or_create_collection(project_id)
             
-            # Generate query embedding
-            query_embedding = self.generate_embeddings([query])[0]
+            # Embed the query on the query path unless the caller already has one,
+            # so it never waits behind document batches
+            if query_embedding is None:
+                query_embedding = self.encode_queries([query])[0]
+            query_embedding = np.asarray(query_embedding, dtype=np.float32).tolist()
             
             # Search in collection
             results = collection.query(
@@ -166,6 +348,21 @@ class VectorService:
             logger.error(f"Error searching similar chunks: {e}")
             return {"documents": [[]], "metadatas": [[]], "distances": [[]]}
     
+    def get_chunks(self, project_id: int, chunk_ids: List[str]) -> List[Dict]:
+        """Fetch the text and metadata of chunks by id"""
+        try:
+            collection = self.get_or_create_collection(project_id)
+            results = collection.get(ids=chunk_ids, include=['documents', 'metadatas'])
+            
+            return [
+                {"chunk_id": chunk_id, "chunk_text": text, "metadata": metadata or {}}
+                for chunk_id, text, metadata in zip(results['ids'], results['documents'], results['metadatas'])
+            ]
+            
+        except Exception as e:
+            logger.error(f"Error fetching chunks for project {project_id}: {e}")
+            return []
+    
     def delete_document_embeddings(self, project_id: int, document_id: int) -> bool:
         """Delete all embeddings for a document"""
         try:
@@ -177,6 +374,7 @@ class VectorService:
             )
             
             logger.info(f"Deleted embeddings for document {document_id} from project {project_id}")
+            self._invalidate_project(project_id)
             return True
             
         except Exception as e:
@@ -187,9 +385,11 @@ class VectorService:
         """Delete entire collection for a project"""
         try:
             collection_name = f"project_{project_id}"
+            self._collections.pop(project_id, None)
             self.client.delete_collection(name=collection_name)
             
             logger.info(f"Deleted collection: {collection_name}")
+            self._invalidate_project(project_id)
             return True
             
         except Exception as e:
@@ -198,18 +398,26 @@ class VectorService:
     
     def get_collection_stats(self, project_id: int) -> Dict:
         """Get statistics about a project collection"""
+        collection_name = f"project_{project_id}"
+        
+        # Reuse a recent count; add and delete paths invalidate it
+        cached = self._chunk_counts.get(project_id)
+        if cached is not None and cached[0] >= time.monotonic():
+            return {"total_chunks": cached[1], "collection_name": collection_name}
+        
         try:
             collection = self.get_or_create_collection(project_id)
             count = collection.count()
+            self._chunk_counts[project_id] = (time.monotonic() + settings.COLLECTION_STATS_TTL, count)
             
             return {
                 "total_chunks": count,
-                "collection_name": f"project_{project_id}"
+                "collection_name": collection_name
             }
             
         except Exception as e:
             logger.error(f"Error getting collection stats: {e}")
-            return {"total_chunks": 0, "collection_name": f"project_{project_id}"}
+            return {"total_chunks": 0, "collection_name": collection_name}
 
 
 # Singleton instance
@@ -1,12 +1,16 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
+import asyncio
 import uvicorn
 
-from app.core.config import settings
+from app.core.config import settings, ensure_dirs
 from app.core.database import create_tables
+from app.core.http import create_http_client, close_http_client
 from app.services.background_processor import background_processor
+from app.services.vector_service import vector_service
 from app.routers import auth, projects, documents, analysis, chat
 
 
@@ -14,13 +18,20 @@ from app.routers import auth, projects, documents, analysis, chat
 async def lifespan(app: FastAPI):
     """Application lifespan manager"""
     # Startup
+    ensure_dirs(settings)
     await create_tables()
     print("📊 Database tables created")
     
+    app.state.http = create_http_client()
+    
     # Start background processor
     await background_processor.start()
     print("🔄 Background processor started")
     
+    # Warm up the embedding model off the event loop, before the first query
+    await asyncio.to_thread(vector_service.warm_up)
+    print("🧠 Embedding model warmed up")
+    
     print("🚀 TutUni AI Backend started successfully")
     
     yield
@@ -28,6 +39,8 @@ async def lifespan(app: FastAPI):
     # Shutdown
     await background_processor.stop()
     print("🔄 Background processor stopped")
+    
+    await close_http_client()
     print("👋 TutUni AI Backend shutting down")
 
 
@@ -37,10 +50,11 @@ app = FastAPI(
     version="0.1.0",
     docs_url="/docs" if settings.ENVIRONMENT == "development" else None,
     redoc_url="/redoc" if settings.ENVIRONMENT == "development" else None,
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
-# CORS Middleware
+# CORS Middleware (frozenset keeps the per-request origin check O(1))
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.ALLOWED_ORIGINS,
@@ -52,7 +66,7 @@ app.add_middleware(
 # Security Middleware
 app.add_middleware(
     TrustedHostMiddleware,
-    allowed_hosts=settings.ALLOWED_HOSTS
+    allowed_hosts=list(settings.ALLOWED_HOSTS)
 )
 
 # Include routers
@@ -23,10 +23,17 @@ interface ChatMessage {
   ai_model?: string
   tokens_used?: number
   processing_time_ms?: number
-  retrieved_chunks?: any[]
+  retrieved_chunks?: RetrievedChunkRef[]
   confidence_score?: number
 }
 
+// Texts are fetched on demand from /api/chat/projects/[projectId]/chunks?ids=...
+interface RetrievedChunkRef {
+  chunk_id: string | null
+  document_id: number
+  similarity_score: number
+}
+
 interface ChatHistoryResponse {
   messages: ChatMessage[]
   total_count: number